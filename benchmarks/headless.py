@@ -0,0 +1,343 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Must be set before pygame is initialised so no window or audio device is opened
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import pygame_gui
+from benchmarks.level_generator import generate_level, default_script, travel_script
+from game_classes.input_handler import ScriptedInputHandler
+from game_classes.input_recorder import InputLog
+from game_states.game_state import GameState
+from game_states.level_index import LevelIndex
+from game_states.level_format import JsonLevel
+from game_states.state_helpers import build_level, load_level, load_level_file
+
+
+def create_headless_context(screen_size=(1280, 720), grid_size=16, physics_tick_rate=60, physics_backend="python"):
+    """Initialise pygame on the dummy video driver and build a game context like GameApp does"""
+    pygame.init()
+    screen = pygame.display.set_mode(screen_size)
+    context = {
+        "ui_manager": pygame_gui.UIManager(screen_size),
+        "screen_size": screen_size,
+        "input_handlers": [],
+        "grid_size": grid_size,
+        "physics_tick_rate": physics_tick_rate,
+        "max_physics_steps": 5,
+        "physics_backend": physics_backend,
+        "merge_blocks_on_load": False,
+        "merge_blocks_on_save": True,
+        "level_index": LevelIndex()  # Never started, levels are found on disk directly
+    }
+    return screen, context
+
+
+class HeadlessRunner:
+    def __init__(self, context, screen=None):
+        """Steps a GameState as fast as possible without a window and reports where the time goes.
+
+        Args:
+            context: Game context, see create_headless_context
+            screen: Surface to render to, rendering is skipped when None
+        """
+        self.context = context
+        self.screen = screen
+        self.state = GameState(context)
+        self.input_handlers = []
+
+    def load_level(self, player_count, world, level):
+        self.state.level_info = {"player_count": player_count, "world": world, "level": level}
+        load_level(self.state, self.context["grid_size"], player_count, world, level)
+        self.attach_scripts()
+
+    def load_level_file(self, path):
+        load_level_file(self.state, self.context["grid_size"], path)
+        self.attach_scripts()
+
+    def load_generated_level(self, block_count, player_count, seed=0, mixed_gravity=False):
+        level = JsonLevel(generate_level(block_count, player_count, self.context["grid_size"], seed, mixed_gravity))
+        build_level(self.state, self.context["grid_size"], level.iter_blocks(), level.iter_players())
+        self.attach_scripts()
+
+    def load_world(self, directory, player_count):
+        self.state.load_world(directory, player_count)
+        self.attach_scripts()
+
+    def attach_scripts(self, scripts=None):
+        """Give every player a scripted input handler, default_script is used when scripts is None"""
+        self.input_handlers = []
+        for i, player in enumerate(self.state.game_sprites["players"].sprites()):
+            script = scripts[i] if scripts else default_script(i)
+            handler = ScriptedInputHandler(script, f"scripted_{i}")
+            handler.player = player
+            player.input_handler = handler
+            self.input_handlers.append(handler)
+
+    def attach_replay(self, log):
+        """Reset the players to where log starts and drive them from it instead of scripts"""
+        players = self.state.game_sprites["players"].sprites()
+        log.apply_start_states(players)
+        log.attach(players)
+        self.input_handlers = []  # Replay handlers step themselves
+        if self.state.batch_physics:
+            self.state.batch_physics.sync_players()
+
+    def run_tick(self, step, tick, render_every=0, phase_times=None):
+        """One fixed step, adding the time of each phase to phase_times if given. Returns whether it rendered."""
+        for handler in self.input_handlers:
+            handler.advance()
+
+        streaming_start = time.perf_counter()
+        if self.state.world:
+            self.state.world.update(self.state)  # Every tick, the camera only follows the players when rendering
+
+        phase_start = time.perf_counter()
+        self.state.calc_next_positions(step)
+        collision_end = time.perf_counter()
+        self.state.move_players(step)
+        movement_end = time.perf_counter()
+        self.state.tick_count += 1
+
+        render_time = 0.0
+        rendered = bool(self.screen and render_every and tick % render_every == 0)
+        if rendered:
+            render_start = time.perf_counter()
+            self.state.update(0)  # Camera follow only, no simulation time passes
+            self.state.render(self.screen)
+            render_time = time.perf_counter() - render_start
+
+        if phase_times is not None:
+            if self.state.world:
+                phase_times["streaming"] += phase_start - streaming_start
+            phase_times["collision"] += collision_end - phase_start
+            phase_times["movement"] += movement_end - collision_end
+            phase_times["render"] += render_time
+        return rendered
+
+    def run(self, ticks, render_every=0, trace_allocations=False, warmup_ticks=0):
+        """Run ticks fixed steps.
+
+        Args:
+            ticks: Number of physics steps to run
+            render_every: Render every n ticks, 0 disables rendering
+            trace_allocations: Track memory with tracemalloc, this slows the run down considerably
+            warmup_ticks: Steps run first and left out of the report, so caches are filled before allocations are
+                measured
+
+        Returns:
+            Report dict with throughput, average milliseconds per phase and allocation figures
+        """
+        step = 1 / self.context["physics_tick_rate"]
+        phase_times = {"collision": 0.0, "movement": 0.0, "render": 0.0, "streaming": 0.0}
+        renders = 0
+
+        for tick in range(warmup_ticks):
+            self.run_tick(step, tick, render_every)
+
+        if trace_allocations:
+            return self.run_traced(ticks, step, render_every)
+
+        start = time.perf_counter()
+        for tick in range(ticks):
+            renders += self.run_tick(step, tick, render_every, phase_times)
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "ticks": ticks,
+            "players": len(self.state.game_sprites["players"]),
+            "blocks": len(self.state.game_sprites["blocks"]),
+            "seconds": elapsed,
+            "ticks_per_second": ticks / elapsed if elapsed else 0,
+            "phase_ms": {
+                "collision": phase_times["collision"] / ticks * 1000,
+                "movement": phase_times["movement"] / ticks * 1000,
+                "render": phase_times["render"] / renders * 1000 if renders else 0
+            }
+        }
+        if self.state.world:
+            report["phase_ms"]["streaming"] = phase_times["streaming"] / ticks * 1000
+            report["world"] = self.state.world.get_stats()
+
+        return report
+
+    def run_traced(self, ticks, step, render_every=0):
+        """Run ticks fixed steps under tracemalloc, measuring what every tick allocates rather than what the run keeps.
+
+        Before each tick the traced peak is reset to the memory in use, so the peak afterwards minus that is the most
+        the tick had allocated at once, even if it was all freed before the tick ended. Memory freed and allocated again
+        within a tick is only counted once, so this is a lower bound on the bytes allocated.
+
+        Returns:
+            Report dict like run without phase times, which tracing would distort, and with allocation figures
+        """
+        gc_collections = sum(stats["collections"] for stats in gc.get_stats())
+        tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        allocated_bytes = 0
+        max_allocated_bytes = 0
+
+        start = time.perf_counter()
+        for tick in range(ticks):
+            current_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self.run_tick(step, tick, render_every)
+            tick_bytes = tracemalloc.get_traced_memory()[1] - current_memory
+            allocated_bytes += tick_bytes
+            max_allocated_bytes = max(max_allocated_bytes, tick_bytes)
+        elapsed = time.perf_counter() - start
+
+        end_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        report = {
+            "ticks": ticks,
+            "players": len(self.state.game_sprites["players"]),
+            "blocks": len(self.state.game_sprites["blocks"]),
+            "seconds": elapsed,
+            "ticks_per_second": ticks / elapsed if elapsed else 0,
+            "phase_ms": {},
+            "allocations": {
+                "bytes_per_tick": allocated_bytes / ticks,
+                "max_bytes_per_tick": max_allocated_bytes,
+                # Garbage collections only run once enough container objects are kept, so any means the ticks leak
+                "gc_collections": sum(stats["collections"] for stats in gc.get_stats()) - gc_collections,
+                "net_bytes": end_memory - start_memory
+            }
+        }
+        if self.state.world:
+            report["world"] = self.state.world.get_stats()
+        return report
+
+
+def print_report(report):
+    print(f"{report['players']} players, {report['blocks']} blocks: "
+          f"{report['ticks']} ticks in {report['seconds']:.3f}s ({report['ticks_per_second']:.0f} ticks/s)")
+    for phase, ms in report["phase_ms"].items():
+        print(f"  {phase:<10} {ms:8.4f} ms")
+    if "world" in report:
+        world = report["world"]
+        print(f"  world: {world['loaded_chunks']} chunks loaded, {world['pending_chunks']} pending, "
+              f"{world['loaded']} added, {world['evicted']} evicted, {world['waited']} waited for")
+    if "allocations" in report:
+        allocations = report["allocations"]
+        print(f"  allocations: {allocations['bytes_per_tick']:.1f} bytes/tick mean, "
+              f"{allocations['max_bytes_per_tick']} max, {allocations['gc_collections']} garbage collections, "
+              f"{allocations['net_bytes']} bytes kept")
+
+
+def get_player_states(players):
+    """Rect and on_ground of every player, what --expect compares"""
+    return [{"rect": list(player.rect), "on_ground": player.on_ground} for player in players]
+
+
+def check_expected(players, path):
+    """Compare the players against the states saved in path. Returns whether they all match."""
+    with open(path) as file:
+        expected = json.load(file)
+    actual = get_player_states(players)
+    if actual == expected:
+        print(f"Players match {path}")
+        return True
+    print(f"Players do not match {path}")
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            print(f"  player {i}: expected {want}, got {got}")
+    if len(expected) != len(actual):
+        print(f"  expected {len(expected)} players, got {len(actual)}")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game simulation headless and report its speed")
+    parser.add_argument("--level", nargs=3, type=int, metavar=("PLAYERS", "WORLD", "LEVEL"), help="Shipped level to load")
+    parser.add_argument("--level-file", help="Level file to load, JSON or binary")
+    parser.add_argument("--world", metavar="DIRECTORY", help="Chunked world to stream, a generated one is created if missing")
+    parser.add_argument("--travel", action="store_true", help="Players keep running right instead of back and forth")
+    parser.add_argument("--no-input", action="store_true", help="Players get no input and just fall and come to rest")
+    parser.add_argument("--blocks", type=int, default=1000, help="Block count of the generated level")
+    parser.add_argument("--players", type=int, default=4, help="Player count of the generated level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mixed-gravity", action="store_true")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--render-every", type=int, default=0)
+    parser.add_argument("--trace-allocations", action="store_true")
+    parser.add_argument("--warmup-ticks", type=int, default=0, help="Steps run before measuring, not included in the report")
+    parser.add_argument("--allocation-limit", type=float, metavar="BYTES",
+                        help="Trace allocations and exit with 1 if a tick allocates more than BYTES on average, "
+                             "or the garbage collector runs")
+    parser.add_argument("--physics-backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--record", metavar="PATH", help="Record the run's inputs to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="Replay recorded inputs and check the players end up where they did")
+    parser.add_argument("--expect", metavar="PATH",
+                        help="Exit with 1 unless the players end with the rects and on_ground saved in PATH")
+    parser.add_argument("--write-expected", metavar="PATH", help="Save the players' final rects and on_ground to PATH")
+    args = parser.parse_args()
+
+    log = InputLog.load(args.replay) if args.replay else None
+    screen, context = create_headless_context(
+        physics_tick_rate=log.tick_rate if log else 60, physics_backend=args.physics_backend
+    )
+    runner = HeadlessRunner(context, screen)
+    if args.level:
+        runner.load_level(*args.level)
+    elif args.level_file:
+        runner.load_level_file(args.level_file)
+    elif args.world:
+        runner.load_world(args.world, args.players)
+    elif log and any(log.level):
+        runner.load_level(*log.level)
+    else:
+        runner.load_generated_level(args.blocks, args.players, args.seed, args.mixed_gravity)
+
+    ticks = args.ticks
+    if args.travel:
+        runner.attach_scripts([travel_script(i) for i in range(len(runner.state.game_sprites["players"]))])
+    if args.no_input:
+        for player in runner.state.game_sprites["players"].sprites():
+            player.input_handler = None
+        runner.input_handlers = []
+    if log:
+        runner.attach_replay(log)
+        ticks = log.tick_count
+    if args.record:
+        runner.state.start_recording()
+
+    trace_allocations = args.trace_allocations or args.allocation_limit is not None
+    report = runner.run(ticks, args.render_every, trace_allocations, args.warmup_ticks)
+    print_report(report)
+
+    if args.record:
+        runner.state.stop_recording(args.record)
+    if log:
+        if log.matches(runner.state.game_sprites["players"].sprites()):
+            print("Replay matches the recording")
+        else:
+            print("Replay does not match the recording")
+            for player, rect in zip(runner.state.game_sprites["players"].sprites(), log.final_rects):
+                print(f"  expected {rect}, got {tuple(player.rect)}")
+            sys.exit(1)
+    if args.write_expected:
+        with open(args.write_expected, "w") as file:
+            json.dump(get_player_states(runner.state.game_sprites["players"].sprites()), file, indent=4)
+    if args.expect and not check_expected(runner.state.game_sprites["players"].sprites(), args.expect):
+        sys.exit(1)
+    if args.allocation_limit is not None:
+        allocations = report["allocations"]
+        if allocations["gc_collections"]:
+            print(f"The garbage collector ran {allocations['gc_collections']} times, so the ticks are keeping objects")
+            sys.exit(1)
+        if allocations["bytes_per_tick"] > args.allocation_limit:
+            print(f"Ticks allocated {allocations['bytes_per_tick']:.1f} bytes each, "
+                  f"more than the limit of {args.allocation_limit:g}")
+            sys.exit(1)
+        print(f"Ticks allocated {allocations['bytes_per_tick']:.1f} bytes each, within the limit of {args.allocation_limit:g}")
+
+if __name__ == "__main__":
+    main()
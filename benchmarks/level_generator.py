@@ -0,0 +1,87 @@
+import json
+import math
+import os
+import random
+
+GRAVITY_DIRECTIONS = ["down", "left", "up", "right"]
+
+
+def generate_level(block_count, player_count, grid_size=16, seed=0, mixed_gravity=False):
+    """Build synthetic level data in the same layout as the JSON level files.
+
+    Players stand side by side on a floor block, the remaining blocks are platforms scattered above it.
+
+    Args:
+        block_count: Total number of blocks, including the floor
+        player_count: Number of players, 1 to 64 is the intended range
+        grid_size: Blocks are aligned to and sized in multiples of this
+        seed: Seed for the platform layout so runs are repeatable
+        mixed_gravity: Cycle players through every gravity direction instead of all falling down
+    """
+    rng = random.Random(seed)
+    blocks = []
+    players = []
+
+    # Floor wide enough for every player with a gap between each
+    player_spacing = grid_size * 3
+    floor_width = max(player_count * player_spacing + grid_size * 8, grid_size * 40)
+    floor_y = 0
+    blocks.append({"x": 0, "y": floor_y, "width": floor_width, "height": grid_size * 2, "color": "blue"})
+
+    # Platforms fill a square area above the floor, sized so density stays similar as block_count grows
+    area_size = max(int(math.sqrt(block_count) * grid_size * 8), floor_width)
+    area_cells = area_size // grid_size
+    area_offset = floor_width // 2 // grid_size * grid_size  # Centre the platforms over the floor
+    clear_cells = 8  # Leave room above the floor for players
+    for _ in range(block_count - 1):
+        blocks.append({
+            "x": (rng.randrange(area_cells) - area_cells // 2) * grid_size + area_offset,
+            "y": -(rng.randrange(area_cells) + clear_cells) * grid_size,
+            "width": rng.randint(1, 8) * grid_size,
+            "height": rng.randint(1, 3) * grid_size,
+            "color": "blue"
+        })
+
+    for i in range(player_count):
+        players.append({
+            "x": grid_size * 4 + i * player_spacing,
+            "y": floor_y - grid_size * 2,
+            "color": "red",
+            "gravity": GRAVITY_DIRECTIONS[i % len(GRAVITY_DIRECTIONS)] if mixed_gravity else "down"
+        })
+
+    return {"blocks": blocks, "players": players}
+
+
+def write_level(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return path
+
+
+def default_script(player_index):
+    """Controls for a scripted player that runs back and forth and jumps, offset per player so they collide"""
+    def script(tick):
+        phase = tick + player_index * 17
+        return {
+            "jump": phase % 45 == 0,
+            "up": False,
+            "down": False,
+            "left": (phase // 120) % 2 == 1,
+            "right": (phase // 120) % 2 == 0,
+        }
+    return script
+
+
+def travel_script(player_index):
+    """Controls for a scripted player that keeps running right and jumping, to cross a streamed world"""
+    def script(tick):
+        return {
+            "jump": (tick + player_index * 7) % 30 == 0,
+            "up": False,
+            "down": False,
+            "left": False,
+            "right": True,
+        }
+    return script
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.headless import HeadlessRunner, create_headless_context
+from benchmarks.level_generator import generate_level, write_level
+from game_classes.block_merge import merge_block_records
+from game_states.level_format import BINARY_EXTENSION, json_to_binary, open_level
+
+
+def time_parse(path):
+    """Seconds to open a level file and read every record, without building sprites"""
+    start = time.perf_counter()
+    with open_level(path) as level:
+        for _ in level.iter_blocks():
+            pass
+        for _ in level.iter_players():
+            pass
+    return time.perf_counter() - start
+
+
+def time_merge(path, grid_size):
+    """Seconds to merge the blocks of a level file like an editor save does, and the block count before and after"""
+    with open_level(path) as level:
+        block_records = list(level.iter_blocks())
+    start = time.perf_counter()
+    merged = merge_block_records(block_records, grid_size)
+    return time.perf_counter() - start, len(block_records), len(merged)
+
+
+def time_build(runner, path):
+    """Seconds to fully load a level file into a GameState"""
+    start = time.perf_counter()
+    runner.load_level_file(path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and binary level load times")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--build-max", type=int, default=10000, help="Only build sprites for levels up to this many blocks")
+    args = parser.parse_args()
+
+    screen, context = create_headless_context()
+    runner = HeadlessRunner(context)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for block_count in args.blocks:
+            json_path = write_level(generate_level(block_count, args.players), os.path.join(directory, f"level_{block_count}.json"))
+            binary_path = json_to_binary(json_path, os.path.join(directory, f"level_{block_count}{BINARY_EXTENSION}"))
+
+            print(f"{block_count} blocks")
+            for name, path in (("json", json_path), ("binary", binary_path)):
+                line = f"  {name:<7} {os.path.getsize(path) / 1024:9.1f} KiB  parse {time_parse(path) * 1000:9.2f} ms"
+                if block_count <= args.build_max:
+                    line += f"  full load {time_build(runner, path) * 1000:9.2f} ms"
+                print(line)
+            merge_time, before, after = time_merge(binary_path, context["grid_size"])
+            print(f"  merge   {merge_time * 1000:9.2f} ms  {before} -> {after} blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import gc
+import tracemalloc
+
+import pygame
+
+from benchmarks.headless import HeadlessRunner, create_headless_context
+from benchmarks.level_generator import generate_level
+from game_classes.block_class import Block
+from game_classes.block_group import BlockGroup
+from game_states.level_format import JsonLevel
+from game_states.state_helpers import build_level
+
+
+def measure(function):
+    """Python heap bytes still allocated after calling function, along with what it returned.
+
+    Only memory allocated through Python is seen, pixel data of surfaces lives in SDL and is counted separately.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current, result
+
+
+def build_blocks(grid_size, block_records):
+    """Just the blocks and the group holding them, without the block index or chunk layer"""
+    blocks = BlockGroup()
+    for x, y, width, height, color in block_records:
+        blocks.add(Block(grid_size, pygame.Rect(x, y, width, height), color))
+    return blocks
+
+
+def get_surface_bytes(state):
+    """Pixel bytes of the chunk surfaces baked so far and of blocks that built their own image"""
+    chunk_bytes = sum(surface.get_pitch() * surface.get_height() for surface in state.chunk_layer.surfaces.values())
+    block_images = [block._image for block in state.game_sprites["blocks"] if block._image is not None]
+    image_bytes = sum(image.get_pitch() * image.get_height() for image in block_images)
+    return chunk_bytes, image_bytes, len(block_images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how much memory each block of a level takes")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args()
+
+    screen, context = create_headless_context()
+    grid_size = context["grid_size"]
+
+    # Fill the shared tile cache first so the first level measured isn't charged for it
+    runner = HeadlessRunner(context, screen)
+    runner.load_generated_level(100, args.players)
+    runner.state.render(screen)
+
+    print("blocks   block objects B/block   whole level B/block   chunk surfaces KiB   block images")
+    for block_count in args.blocks:
+        level = JsonLevel(generate_level(block_count, args.players, grid_size))
+        block_records = list(level.iter_blocks())
+        player_records = list(level.iter_players())
+
+        block_bytes, blocks = measure(lambda: build_blocks(grid_size, block_records))
+        del blocks
+
+        runner = HeadlessRunner(context, screen)
+        level_bytes, _ = measure(lambda: build_level(runner.state, grid_size, block_records, player_records))
+
+        # Surfaces are only made for what is on screen
+        runner.state.render(screen)
+        chunk_bytes, image_bytes, image_count = get_surface_bytes(runner.state)
+
+        print(f"{block_count:>6}   {block_bytes / block_count:>21.0f}   {level_bytes / block_count:>19.0f}   "
+              f"{chunk_bytes / 1024:>18.0f}   {image_count:>6} ({image_bytes / 1024:.0f} KiB)")
+        del runner
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+
+from benchmarks.headless import HeadlessRunner, create_headless_context, print_report
+from game_classes.player_broadphase import PLAYER_BROADPHASES
+
+
+def run_scaling(block_counts, player_counts, ticks, render_every=0, mixed_gravity=False, physics_backend="python", player_broadphase="sweep"):
+    """Run every combination of block and player count on generated levels, returns the list of reports"""
+    screen, context = create_headless_context(physics_backend=physics_backend)
+    reports = []
+    for block_count in block_counts:
+        for player_count in player_counts:
+            runner = HeadlessRunner(context, screen)
+            runner.state.player_broadphase = PLAYER_BROADPHASES[player_broadphase]()
+            runner.load_generated_level(block_count, player_count, mixed_gravity=mixed_gravity)
+            report = runner.run(ticks, render_every)
+            report["physics_backend"] = physics_backend
+            report["player_broadphase"] = player_broadphase
+            report["player_candidates"] = runner.state.player_broadphase.candidate_count  # Of the last tick
+            print_report(report)
+            reports.append(report)
+    return reports
+
+
+def print_player_scaling(reports):
+    """Table of how the collision phase grows with player count, per block count"""
+    print("blocks  players  collision ms/tick  us/player  players tested/tick")
+    for report in reports:
+        per_player = report["phase_ms"]["collision"] * 1000 / report["players"] if report["players"] else 0
+        print(f"{report['blocks']:>6}  {report['players']:>7}  {report['phase_ms']['collision']:>17.4f}  "
+              f"{per_player:>9.2f}  {report['player_candidates']:>19}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how physics and render cost scale with level size and player count")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--players", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--render-every", type=int, default=0)
+    parser.add_argument("--mixed-gravity", action="store_true")
+    parser.add_argument("--physics-backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--player-broadphase", choices=list(PLAYER_BROADPHASES), default="sweep",
+                        help="How players find each other with the python backend, all tests every pair")
+    parser.add_argument("--json", help="Write the reports to this file")
+    args = parser.parse_args()
+
+    reports = run_scaling(
+        args.blocks, args.players, args.ticks, args.render_every, args.mixed_gravity, args.physics_backend, args.player_broadphase
+    )
+    print_player_scaling(reports)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=4)
+        print(f"Reports saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import time
+
+import pygame
+
+from benchmarks.headless import create_headless_context
+from game_states.editor_state import EditorState
+
+
+def time_drag(context, screen, zoom, step):
+    """Drag out a block across the whole screen in the editor, rendering after every mouse move like the game loop
+
+    Returns:
+        Milliseconds each mouse move took to handle and to render, and the final block size in grid squares
+    """
+    editor = EditorState(context)
+    editor.camera.zoom = zoom
+    editor.render(screen)
+
+    width, height = screen.get_size()
+    editor.handle_events([pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=(0, 0))])
+    handle_times = []
+    render_times = []
+    for x in range(step, width, step):
+        y = x * height // width
+        event = pygame.event.Event(pygame.MOUSEMOTION, pos=(x, y), rel=(step, step), buttons=(1, 0, 0))
+        start = time.perf_counter()
+        editor.handle_events([event])
+        handled = time.perf_counter()
+        editor.render(screen)
+        handle_times.append((handled - start) * 1000)
+        render_times.append((time.perf_counter() - handled) * 1000)
+    editor.handle_events([pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=(width - 1, height - 1))])
+
+    block = editor.game_sprites["blocks"].sprite_list()[-1]
+    size = (block.rect.width // editor.grid_size, block.rect.height // editor.grid_size)
+    return handle_times, render_times, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time drag-resizing a block in the editor as it grows across the screen")
+    parser.add_argument("--zoom", type=float, nargs="+", default=[2, 1, 0.3], help="Camera zoom, smaller draws a larger block")
+    parser.add_argument("--step", type=int, default=8, help="Screen pixels the mouse moves between events")
+    args = parser.parse_args()
+
+    screen, context = create_headless_context()
+    print("zoom   final block   moves   handle ms mean/max   render ms mean/max")
+    for zoom in args.zoom:
+        handle_times, render_times, size = time_drag(context, screen, zoom, args.step)
+        print(f"{zoom:>4g}   {size[0]:>4} x {size[1]:<4}   {len(handle_times):>5}   "
+              f"{sum(handle_times) / len(handle_times):>8.3f} / {max(handle_times):<7.3f}   "
+              f"{sum(render_times) / len(render_times):>8.3f} / {max(render_times):.3f}")
+
+
+if __name__ == "__main__":
+    main()
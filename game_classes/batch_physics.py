@@ -0,0 +1,356 @@
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, without it players are simulated one at a time
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+MIN_COLUMN_WIDTH = 256  # Narrowest column blocks are sorted into, in world pixels
+COLUMN_KEY = 1 << 32  # Sort keys are column * COLUMN_KEY + top, so blocks sort by column and then by top
+
+
+class VectorView:
+    __slots__ = ("values", "index")
+
+    def __init__(self, values, row):
+        """Stands in for a player's pygame.Vector2, reading and writing one row of a (n, 2) array.
+
+        Args:
+            values: Flat memoryview of the array's float64 values, made by flat_view. Indexing it gives Python
+                floats several times quicker than indexing the array, which matters as input handling reads and
+                writes players' vectors one component at a time.
+            row: Row of the array this vector is
+        """
+        self.values = values
+        self.index = row * 2
+
+    @property
+    def x(self):
+        return self.values[self.index]
+
+    @x.setter
+    def x(self, value):
+        self.values[self.index] = value
+
+    @property
+    def y(self):
+        return self.values[self.index + 1]
+
+    @y.setter
+    def y(self, value):
+        self.values[self.index + 1] = value
+
+    def update(self, *args):
+        x, y = args[0] if len(args) == 1 else args
+        self.values[self.index] = x
+        self.values[self.index + 1] = y
+
+    def __getitem__(self, axis):
+        return self.values[self.index + axis]
+
+    def __setitem__(self, axis, value):
+        self.values[self.index + axis] = value
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return f"VectorView({self.x}, {self.y})"
+
+
+def flat_view(array):
+    """Flat memoryview of a C-contiguous float64 array, for VectorView"""
+    return memoryview(array).cast("B").cast("d")
+
+
+class BatchPhysics:
+    def __init__(self):
+        """Simulates every player in one go on NumPy arrays (structure of arrays) instead of one Player at a time.
+
+        Gravity, velocity, the broadphase and the swept collision response all run as array operations over every
+        player, or every (player, rect) pair, at once. Players stay ordinary sprites: their location and velocity
+        become VectorViews into the arrays, so input handling and rendering work unchanged. The collision response
+        mirrors Player.resolve_collisions step for step so results match the per-player path exactly.
+
+        The fixed cost of the array operations is paid every step whatever the player count, so this is only faster
+        than the per-player path with many players, see physics_benchmark.
+        """
+        if np is None:
+            raise ImportError("The numpy physics backend needs NumPy to be installed")
+
+        self.players = []
+        self.location = np.zeros((0, 2))
+        self.velocity = np.zeros((0, 2))
+        self.gravity = np.zeros((0, 2))
+        self.rects = np.zeros((0, 4), dtype=np.int64)  # x, y, width, height of each player, kept across steps
+        self.ground_offsets = np.zeros((0, 2), dtype=np.int64)  # Player.ground_offset, (0, 0) when flying
+        self.has_ground = np.zeros(0, dtype=bool)  # Whether each player has a ground_offset
+        self.on_ground = np.zeros(0, dtype=bool)
+
+        self.block_index = None
+        self.block_version = None  # block_index.version the rects were copied at
+        self.block_bounds = np.zeros((0, 4), dtype=np.int64)  # left, top, right, bottom of each block rect
+        self.large_blocks = np.zeros(0, dtype=np.int64)  # Indices of blocks much wider or taller than most
+        self.column_order = np.zeros(0, dtype=np.int64)  # Indices of the other blocks sorted by column, then top
+        self.column_keys = np.zeros(0, dtype=np.int64)  # Sort key of each block in column_order
+        self.column_width = MIN_COLUMN_WIDTH
+        self.max_block_size = (0, 0)  # Widest and tallest block in column_order
+
+        self.candidate_count = 0  # Collision candidates found by the last step
+
+    def bind(self, players):
+        """Take over the kinematics of players, their location and velocity are moved into the arrays"""
+        self.players = list(players)
+        count = len(self.players)
+        self.location = np.array([tuple(player.location) for player in self.players], dtype=np.float64).reshape(count, 2)
+        self.velocity = np.array([tuple(player.velocity) for player in self.players], dtype=np.float64).reshape(count, 2)
+        self.sync_players()
+
+        location_values = flat_view(self.location)
+        velocity_values = flat_view(self.velocity)
+        for row, player in enumerate(self.players):
+            player.location = VectorView(location_values, row)
+            player.velocity = VectorView(velocity_values, row)
+
+    def sync_players(self):
+        """Copy the players' rects, gravity and on_ground into the arrays.
+
+        step keeps the rects itself, assuming Player.apply_next_pos follows every step. Call this after moving
+        players or changing their gravity any other way, e.g. Player.update_gravity_direction.
+        """
+        players = self.players
+        count = len(players)
+        self.rects = np.array([tuple(player.rect) for player in players], dtype=np.int64).reshape(count, 4)
+        self.gravity = np.array([tuple(player.gravity_vector) for player in players], dtype=np.float64).reshape(count, 2)
+        self.ground_offsets = np.array(
+            [player.ground_offset or (0, 0) for player in players], dtype=np.int64
+        ).reshape(count, 2)
+        self.has_ground = np.array([player.ground_offset is not None for player in players], dtype=bool)
+        self.on_ground = np.array([player.on_ground for player in players], dtype=bool)
+
+    def set_blocks(self, block_index):
+        """Copy the block rects out of block_index, call after blocks are added, removed or resized"""
+        blocks = sorted(block_index.sprite_cells, key=block_index.insert_order.__getitem__)
+        # Empty rects never collide
+        block_rects = [block.rect for block in blocks if block.rect.width > 0 and block.rect.height > 0]
+        self.block_bounds = np.array(
+            [(rect.left, rect.top, rect.right, rect.bottom) for rect in block_rects], dtype=np.int64
+        ).reshape(len(block_rects), 4)
+
+        # Blocks are put in columns by their left edge and sorted by top within each, so those that can reach a search
+        # area form one range per column. That only works if their reach is short, so the few unusually large blocks
+        # (e.g. floors) are tested separately.
+        sizes = self.block_bounds[:, 2:] - self.block_bounds[:, :2]
+        if len(sizes):
+            is_large = (sizes > 4 * np.median(sizes, axis=0)).any(axis=1)
+        else:
+            is_large = np.zeros(0, dtype=bool)
+        self.large_blocks = np.flatnonzero(is_large)
+        small_blocks = np.flatnonzero(~is_large)
+        max_width, max_height = sizes[small_blocks].max(axis=0, initial=0).tolist()
+        self.max_block_size = (max_width, max_height)
+        self.column_width = max(max_width, MIN_COLUMN_WIDTH)
+        keys = self.block_bounds[small_blocks, 0] // self.column_width * COLUMN_KEY + self.block_bounds[small_blocks, 1]
+        order = np.argsort(keys, kind="stable")
+        self.column_order = small_blocks[order]
+        self.column_keys = keys[order]
+        self.block_index = block_index
+        self.block_version = block_index.version
+
+    @staticmethod
+    def _expand_ranges(range_starts, range_ends):
+        """Every integer in each range [start, end), along with the index of the range it came from"""
+        counts = np.maximum(range_ends - range_starts, 0)
+        ranges = np.repeat(np.arange(len(range_starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return ranges, np.repeat(range_starts, counts) + offsets
+
+    def _find_candidates(self, search_min, search_max):
+        """Rects each player's search area overlaps, in the order the per-player path tests them: blocks in
+        insertion order, then other players by index.
+
+        Returns:
+            Row of the player each pair belongs to, sorted, and left, top, right, bottom of the rect of each pair
+        """
+        rects = self.rects
+        player_count = len(rects)
+
+        # Columns blocks starting left of a search area can reach into it from, a block is at most a column wide
+        max_width, max_height = self.max_block_size
+        first_columns = (search_min[:, 0] - max_width) // self.column_width
+        last_columns = (search_max[:, 0] - 1) // self.column_width
+        column_rows, columns = self._expand_ranges(first_columns, last_columns + 1)
+
+        # Within a column, the blocks that can reach into the search area in y are one range
+        column_keys = columns * COLUMN_KEY
+        ranges, positions = self._expand_ranges(
+            np.searchsorted(self.column_keys, column_keys + search_min[column_rows, 1] - max_height, side="right"),
+            np.searchsorted(self.column_keys, column_keys + search_max[column_rows, 1], side="left")
+        )
+        block_rows = column_rows[ranges]
+        block_ids = self.column_order[positions]
+
+        # Large blocks against every player
+        block_rows = np.concatenate((block_rows, np.repeat(np.arange(player_count), len(self.large_blocks))))
+        block_ids = np.concatenate((block_ids, np.tile(self.large_blocks, player_count)))
+        block_bounds = self.block_bounds[block_ids]
+
+        # Players are swept the same way, using their rects from before this step
+        player_bounds = np.concatenate((rects[:, :2], rects[:, :2] + rects[:, 2:]), axis=1)
+        player_order = np.argsort(rects[:, 0], kind="stable")
+        player_lefts = rects[player_order, 0]
+        player_rows, positions = self._expand_ranges(
+            np.searchsorted(player_lefts, search_min[:, 0] - int(rects[:, 2].max()), side="right"),
+            np.searchsorted(player_lefts, search_max[:, 0], side="left")
+        )
+        player_ids = player_order[positions]
+        keep = player_rows != player_ids
+        player_rows = player_rows[keep]
+        player_ids = player_ids[keep]
+
+        rows = np.concatenate((block_rows, player_rows))
+        sort_keys = np.concatenate((block_ids, player_ids + len(self.block_bounds)))  # Players after every block
+        bounds = np.concatenate((block_bounds, player_bounds[player_ids]))
+        overlapping = (
+            (bounds[:, 0] < search_max[rows, 0]) & (bounds[:, 2] > search_min[rows, 0]) &
+            (bounds[:, 1] < search_max[rows, 1]) & (bounds[:, 3] > search_min[rows, 1])
+        )
+        rows = rows[overlapping]
+        order = np.lexsort((sort_keys[overlapping], rows))
+        return rows[order], bounds[overlapping][order]
+
+    @staticmethod
+    def _get_overlap_times(start, end, obstacle_start, obstacle_end, delta):
+        """Player._get_overlap_times for every pair"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            towards_start = (obstacle_start - end) / delta
+            towards_end = (obstacle_end - start) / delta
+        overlapping = (start < obstacle_end) & (obstacle_start < end)
+        entry = np.where(delta > 0, towards_start, np.where(delta < 0, towards_end, np.where(overlapping, -np.inf, np.inf)))
+        exit_ = np.where(delta > 0, towards_end, np.where(delta < 0, towards_start, np.where(overlapping, np.inf, -np.inf)))
+        return entry, exit_
+
+    @staticmethod
+    def _clamp_moves(position, sizes, moves, axes, rows, bounds):
+        """Player._clamp_move for every player with candidates, each along its own axis
+
+        Args:
+            position: x, y of each player's rect
+            sizes: width, height of each player's rect
+            moves: Distance each player wants to move along its axis
+            axes: Axis (0 for x, 1 for y) each player moves along
+            rows: Player of each candidate pair
+            bounds: left, top, right, bottom of each candidate rect
+
+        Returns:
+            Distance each player can move
+        """
+        player_rows = np.arange(len(position))
+        other = 1 - axes
+        start = position[player_rows, axes]
+        end = start + sizes[player_rows, axes]
+        other_start = position[player_rows, other]
+        other_end = other_start + sizes[player_rows, other]
+
+        pair_axes = axes[rows]
+        obstacle_start = bounds[np.arange(len(rows)), pair_axes]
+        obstacle_end = bounds[np.arange(len(rows)), pair_axes + 2]
+        obstacle_other_start = bounds[np.arange(len(rows)), 1 - pair_axes]
+        obstacle_other_end = bounds[np.arange(len(rows)), 3 - pair_axes]
+        pair_moves = moves[rows]
+
+        # Only rects overlapping on the other axis can be hit
+        in_line = (obstacle_other_start < other_end[rows]) & (obstacle_other_end > other_start[rows])
+        ahead = in_line & (pair_moves > 0) & (obstacle_start >= end[rows])
+        behind = in_line & (pair_moves < 0) & (obstacle_end <= start[rows])
+
+        allowed = moves.copy()
+        np.minimum.at(allowed, rows[ahead], obstacle_start[ahead] - end[rows[ahead]])
+        np.maximum.at(allowed, rows[behind], obstacle_end[behind] - start[rows[behind]])
+        return allowed
+
+    def step(self, delta_time, block_index, players):
+        """Equivalent of calling Player.calc_next_pos on every player
+
+        Args:
+            delta_time: Seconds to simulate
+            block_index: SpatialHash of the level's static blocks
+            players: All players, other players are treated as solid
+        """
+        if players != self.players:
+            self.bind(players)
+        if block_index is not self.block_index or block_index.version != self.block_version:
+            self.set_blocks(block_index)
+        if not players:
+            return
+
+        # === Integrate every player at once ===
+        self.velocity += self.gravity * delta_time
+        self.location += self.velocity * delta_time
+        future = np.rint(self.location).astype(np.int64)  # Rounds half to even like round()
+
+        # === Broadphase ===
+        # Search area of each player covers its whole move, grown by its size on every side
+        rects = self.rects
+        position = rects[:, :2]
+        sizes = rects[:, 2:]
+        search_min = np.minimum(position, future) - sizes
+        search_max = np.maximum(position, future) + sizes * 2
+        rows, bounds = self._find_candidates(search_min, search_max)
+        self.candidate_count = len(rows)
+
+        # === Narrowphase, every player with candidates at once ===
+        active = np.unique(rows)  # Players without candidates just move to their integrated position
+        if len(active):
+            rows = np.searchsorted(active, rows)  # Pair rows now index into active
+            start = position[active]
+            size = sizes[active]
+            move = future[active] - start
+
+            # Swept AABB test for the axis each player hits first, ties go to the first rect like the per-player loop
+            pair_start = start[rows]
+            pair_end = pair_start + size[rows]
+            x_entry, x_exit = self._get_overlap_times(pair_start[:, 0], pair_end[:, 0], bounds[:, 0], bounds[:, 2], move[rows, 0])
+            y_entry, y_exit = self._get_overlap_times(pair_start[:, 1], pair_end[:, 1], bounds[:, 1], bounds[:, 3], move[rows, 1])
+            entry = np.maximum(x_entry, y_entry)
+            hit = (entry < np.minimum(x_exit, y_exit)) & (entry >= 0) & (entry < 1.0)
+            first_entry = np.full(len(active), np.inf)
+            np.minimum.at(first_entry, rows[hit], entry[hit])
+            first_hits = np.flatnonzero(hit & (entry == first_entry[rows]))
+            hit_rows, first_positions = np.unique(rows[first_hits], return_index=True)
+            first_hits = first_hits[first_positions]
+
+            # Slide along the surface hit first (y first after an x hit), then move along the other axis
+            first_axes = np.zeros(len(active), dtype=np.int64)
+            first_axes[hit_rows] = x_entry[first_hits] > y_entry[first_hits]
+            resolved = start.copy()
+            velocity = self.velocity[active]
+            player_rows = np.arange(len(active))
+            for axes in (first_axes, 1 - first_axes):
+                wanted = move[player_rows, axes]
+                allowed = self._clamp_moves(resolved, size, wanted, axes, rows, bounds)
+                velocity[player_rows[allowed != wanted], axes[allowed != wanted]] = 0  # Blocked axis loses its speed
+                resolved[player_rows, axes] += allowed
+            self.velocity[active] = velocity
+            self.location[active] = resolved
+            future[active] = resolved
+
+            # Standing on something when a candidate is one pixel towards gravity from the rect before the move
+            check = start[rows] + self.ground_offsets[active][rows]
+            touching = (
+                (check[:, 0] < bounds[:, 2]) & (check[:, 1] < bounds[:, 3]) &
+                (check[:, 0] + size[rows, 0] > bounds[:, 0]) & (check[:, 1] + size[rows, 1] > bounds[:, 1])
+            )
+            on_ground = np.zeros(len(active), dtype=bool)
+            on_ground[rows[touching]] = True
+            self.on_ground[active] = on_ground & self.has_ground[active]
+
+        # Players take the results as Python objects, apply_next_pos then moves their rects there
+        position[:] = future
+        for player, topleft, on_ground in zip(players, future.tolist(), self.on_ground.tolist()):
+            player.future_rect.topleft = topleft
+            player.on_ground = on_ground
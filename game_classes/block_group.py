@@ -0,0 +1,49 @@
+class BlockGroup:
+    def __init__(self, *blocks):
+        """Ordered collection of blocks, used in place of a sprite Group since blocks aren't sprites.
+
+        Blocks don't keep track of the groups they are in, so they are removed through the group rather than
+        with kill(). Like EntityGroup, sprite_list returns the same list until the group changes.
+        """
+        self.blocks = {}  # block -> None, a dict keeps insertion order and removes in O(1)
+        self.block_cache = None
+        self.add(*blocks)
+
+    def add(self, *blocks):
+        for block in blocks:
+            self.blocks[block] = None
+        self.block_cache = None
+
+    def remove(self, *blocks):
+        for block in blocks:
+            self.blocks.pop(block, None)
+        self.block_cache = None
+
+    def empty(self):
+        self.blocks.clear()
+        self.block_cache = None
+
+    def has(self, block):
+        return block in self.blocks
+
+    def sprites(self):
+        """New list of the blocks in the order they were added"""
+        return list(self.blocks)
+
+    def sprite_list(self):
+        """Blocks in the order they were added, shared between calls so it must not be modified"""
+        if self.block_cache is None:
+            self.block_cache = list(self.blocks)
+        return self.block_cache
+
+    def __contains__(self, block):
+        return block in self.blocks
+
+    def __iter__(self):
+        return iter(self.sprite_list())  # Safe to remove blocks while iterating, changes replace the cached list
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __bool__(self):
+        return bool(self.blocks)
@@ -0,0 +1,135 @@
+def _greedy_rects(cells):
+    """Cover a set of grid cells with rectangles, returned as (cell_x, cell_y, width, height)"""
+    cells = set(cells)
+    rects = []
+    for cell_x, cell_y in sorted(cells, key=lambda cell: (cell[1], cell[0])):
+        if (cell_x, cell_y) not in cells:
+            continue  # Already part of a rectangle
+
+        width = 1
+        while (cell_x + width, cell_y) in cells:
+            width += 1
+
+        height = 1
+        while all((x, cell_y + height) in cells for x in range(cell_x, cell_x + width)):
+            height += 1
+
+        for x in range(cell_x, cell_x + width):
+            for y in range(cell_y, cell_y + height):
+                cells.discard((x, y))
+
+        rects.append((cell_x, cell_y, width, height))
+    return rects
+
+
+def _connected_groups(cells):
+    """Split a set of grid cells into groups of cells touching along an edge
+
+    Returns:
+        List of groups (sets of cells) and a dict of cell -> index of its group in that list
+    """
+    unvisited = set(cells)
+    groups = []
+    group_of = {}
+    while unvisited:
+        group_id = len(groups)
+        start = unvisited.pop()
+        group = {start}
+        group_of[start] = group_id
+        stack = [start]
+        while stack:
+            cell_x, cell_y = stack.pop()
+            for neighbour in ((cell_x + 1, cell_y), (cell_x - 1, cell_y), (cell_x, cell_y + 1), (cell_x, cell_y - 1)):
+                if neighbour in unvisited:
+                    unvisited.remove(neighbour)
+                    group.add(neighbour)
+                    group_of[neighbour] = group_id
+                    stack.append(neighbour)
+        groups.append(group)
+    return groups, group_of
+
+
+def merge_block_records(block_records, grid_size):
+    """Greedily coalesce touching or overlapping same-colour blocks into as few rectangles as possible.
+
+    Blocks are rasterised onto the grid per colour and split into groups of touching cells. Each unvisited cell
+    of a group (top to bottom, left to right) starts a rectangle that grows right as far as it can, then down
+    while the whole row below fits. A group keeps its original blocks if that would not reduce their number.
+    Blocks not aligned to the grid are kept as they are.
+
+    Args:
+        block_records: Iterable of (x, y, width, height, color)
+        grid_size: Size of a grid square in world pixels
+
+    Returns:
+        List of merged (x, y, width, height, color) records
+    """
+    merged = []
+    blocks_by_color = {}  # color -> list of (record, cells covered)
+
+    for record in block_records:
+        x, y, width, height, color = record
+        if x % grid_size or y % grid_size or width % grid_size or height % grid_size or width <= 0 or height <= 0:
+            merged.append(record)
+            continue
+
+        left, top = x // grid_size, y // grid_size
+        cells = [(cell_x, cell_y) for cell_x in range(left, left + width // grid_size) for cell_y in range(top, top + height // grid_size)]
+        blocks_by_color.setdefault(color, []).append((record, cells))
+
+    for color, blocks in blocks_by_color.items():
+        all_cells = set()
+        for _, cells in blocks:
+            all_cells.update(cells)
+
+        # One pass puts every block in the bucket of its group, a block's cells are all in the same group
+        groups, group_of = _connected_groups(all_cells)
+        originals_by_group = [[] for _ in groups]
+        for record, cells in blocks:
+            originals_by_group[group_of[cells[0]]].append(record)
+
+        for group, originals in zip(groups, originals_by_group):
+            rects = _greedy_rects(group)
+            if len(rects) >= len(originals):
+                merged.extend(originals)
+                continue
+            for cell_x, cell_y, width, height in rects:
+                merged.append((cell_x * grid_size, cell_y * grid_size, width * grid_size, height * grid_size, color))
+
+    return merged
+
+
+def merge_if_smaller(block_records, grid_size):
+    """Merge block records, returning the original list when merging would not reduce the block count"""
+    block_records = list(block_records)
+    merged = merge_block_records(block_records, grid_size)
+    if len(merged) >= len(block_records):
+        return block_records
+
+    print(f"Merged {len(block_records)} blocks into {len(merged)} ({len(block_records) - len(merged)} removed)")
+    return merged
+
+
+def get_merge_changes(block_records, grid_size):
+    """What merging would change, so a level already built can be updated without rebuilding it
+
+    Returns:
+        Indices into block_records of the blocks merged away and the merged records replacing them, both empty when
+        merging would not reduce the block count
+    """
+    block_records = list(block_records)
+    merged = merge_if_smaller(block_records, grid_size)
+    if len(merged) == len(block_records):
+        return [], []
+
+    remaining = {}  # record -> how many of it the merge kept and haven't been matched to a block yet
+    for record in merged:
+        remaining[record] = remaining.get(record, 0) + 1
+    replaced = []
+    for i, record in enumerate(block_records):
+        if remaining.get(record):
+            remaining[record] -= 1
+        else:
+            replaced.append(i)
+    added = [record for record, count in remaining.items() for _ in range(count)]
+    return replaced, added
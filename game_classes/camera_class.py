@@ -1,4 +1,6 @@
+import math
 import pygame
+from game_classes.input_state import input_state
 
 # This camera class allows for a game to be drawn on a separate surface and viewed through the window via this camera.
 # Requires handle_input() (every frame) and handle_zoom() (on mouse scroll event)
@@ -26,6 +28,17 @@ class Camera:
         """Convert screen position to game position"""
         return (pos[0] + self.x * self.zoom) / self.zoom, (pos[1] + self.y * self.zoom) / self.zoom
 
+    def get_visible_rect(self, out=None):
+        """Area of the game world currently visible on screen, written into out instead of a new rect if given"""
+        rect = out if out is not None else pygame.Rect(0, 0, 0, 0)
+        rect.update(
+            math.floor(self.x),
+            math.floor(self.y),
+            math.ceil(self.screen_size[0] / self.zoom) + 1,
+            math.ceil(self.screen_size[1] / self.zoom) + 1
+        )
+        return rect
+
     def move_center_to(self, dest_pos):
         center_pos = self.screen_pos_to_game((self.screen_size[0] / 2, self.screen_size[1] / 2))
         self.x -= center_pos[0] - dest_pos[0]
@@ -65,7 +78,7 @@ class Camera:
                 self.y -= event.rel[1] / self.zoom
 
     def handle_frame_input(self):
-        keys = pygame.key.get_pressed()
+        keys = input_state.get_pressed()
         if keys[self.controls["up"]]:
             self.y -= self.speed
         if keys[self.controls["down"]]:
@@ -0,0 +1,143 @@
+import math
+from collections import OrderedDict
+import pygame
+from game_classes.scaled_image_cache import ScaledImageCache
+from game_classes.spatial_hash import SpatialHash
+
+
+class StaticChunkLayer:
+    def __init__(self, chunk_size=512, max_baked_chunks=96, max_cached_zoom=2):
+        """Static blocks pre-rendered into fixed-size chunk surfaces so drawing costs one blit per visible chunk.
+
+        Chunks are baked the first time they are seen and rebaked lazily after a block inside them changes.
+
+        Args:
+            chunk_size: Width and height of a chunk in world pixels
+            max_baked_chunks: Baked chunk surfaces kept before the least recently drawn one is dropped
+            max_cached_zoom: Above this zoom only the visible part of a chunk is scaled, every frame,
+                because a fully scaled chunk would be huge
+        """
+        self.chunk_size = chunk_size
+        self.max_baked_chunks = max_baked_chunks
+        self.max_cached_zoom = max_cached_zoom
+
+        self.index = SpatialHash(chunk_size)  # Chunk key -> blocks overlapping that chunk
+        self.surfaces = OrderedDict()  # Chunk key -> baked surface at world scale, missing when dirty
+        self.scaled_surfaces = {}  # Chunk key -> ScaledImageCache of the baked surface
+
+        self.bake_count = 0
+        self.draw_stats = {"drawn": 0, "culled": 0}  # Chunks drawn and culled last frame
+        # Scratch rects reused by draw
+        self.chunk_rect = pygame.Rect(0, 0, chunk_size, chunk_size)
+        self.visible_rect = pygame.Rect(0, 0, 0, 0)
+
+    def build(self, blocks):
+        self.index.clear()
+        self.surfaces.clear()
+        self.scaled_surfaces.clear()
+        for block in blocks:
+            self.index.insert(block)
+
+    def mark_dirty(self, key):
+        self.surfaces.pop(key, None)
+        self.scaled_surfaces.pop(key, None)
+
+    def add_block(self, block):
+        self.index.insert(block)
+        for key in self.index.sprite_cells[block]:
+            self.mark_dirty(key)
+
+    def remove_block(self, block):
+        for key in self.index.sprite_cells.get(block, ()):
+            self.mark_dirty(key)
+        self.index.remove(block)
+
+    def update_block(self, block, old_rect=None):
+        """Rebake the chunks a block was and is now in, call after the block moves, resizes or changes image
+
+        Args:
+            block: Block that changed
+            old_rect: Rect the block had before a resize. If its top left corner stayed put, the centre fill inside
+                both the old and new borders is drawn the same, so chunks entirely within it are kept.
+        """
+        if old_rect is None or old_rect.topleft != block.rect.topleft:
+            self.remove_block(block)
+            self.add_block(block)
+            return
+
+        old_keys = self.index.sprite_cells.get(block, ())
+        self.index.update(block)
+        border = block.grid_size * 2
+        unchanged = old_rect.inflate(-border, -border).clip(block.rect.inflate(-border, -border))
+        chunk_rect = pygame.Rect(0, 0, self.chunk_size, self.chunk_size)
+        for key in set(old_keys).union(self.index.sprite_cells[block]):
+            chunk_rect.topleft = (key[0] * self.chunk_size, key[1] * self.chunk_size)
+            if not unchanged.contains(chunk_rect):
+                self.mark_dirty(key)
+
+    def _bake(self, key):
+        chunk_x = key[0] * self.chunk_size
+        chunk_y = key[1] * self.chunk_size
+        surface = pygame.Surface((self.chunk_size, self.chunk_size), pygame.SRCALPHA).convert_alpha()
+        surface.fill((0, 0, 0, 0))
+
+        # Every tile of every block in the chunk goes through one blits call, straight from the tile atlas
+        blocks = sorted(self.index.cells.get(key, ()), key=self.index.insert_order.__getitem__)
+        chunk_rect = surface.get_rect()
+        blit_sequence = []
+        for block in blocks:
+            blit_sequence += block.get_tile_blits(block.rect.x - chunk_x, block.rect.y - chunk_y, chunk_rect)
+        surface.blits(blit_sequence, doreturn=False)
+
+        self.bake_count += 1
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_baked_chunks:
+            old_key, _ = self.surfaces.popitem(last=False)
+            self.scaled_surfaces.pop(old_key, None)
+        return surface
+
+    def _get_surface(self, key):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            return self._bake(key)
+        self.surfaces.move_to_end(key)
+        return surface
+
+    def draw(self, surface, camera):
+        visible_rect = camera.get_visible_rect(self.visible_rect)
+        chunk_size = self.chunk_size
+        cells = self.index.cells
+        drawn = 0
+        # Same cells as index.get_cell_keys(visible_rect), looped over directly so drawing doesn't build a tuple
+        left, top = visible_rect.left // chunk_size, visible_rect.top // chunk_size
+        right, bottom = (visible_rect.right - 1) // chunk_size, (visible_rect.bottom - 1) // chunk_size
+        for chunk_x in range(left, right + 1):
+            for chunk_y in range(top, bottom + 1):
+                key = (chunk_x, chunk_y)
+                if key not in cells:
+                    continue  # Empty chunk
+                drawn += 1
+                self._draw_chunk(surface, camera, key, visible_rect)
+
+        self.draw_stats["drawn"] = drawn
+        self.draw_stats["culled"] = len(cells) - drawn
+        return self.draw_stats
+
+    def _draw_chunk(self, surface, camera, key, visible_rect):
+        chunk_size = self.chunk_size
+        chunk_rect = self.chunk_rect
+        chunk_surface = self._get_surface(key)
+        chunk_rect.topleft = (key[0] * chunk_size, key[1] * chunk_size)
+
+        if camera.zoom <= self.max_cached_zoom:
+            if key not in self.scaled_surfaces:
+                self.scaled_surfaces[key] = ScaledImageCache(max_entries=2, zoom_steps=100000, round_up=True)
+            scaled_surface = self.scaled_surfaces[key].get_scaled(chunk_surface, camera.zoom)
+            area = chunk_rect
+        else:
+            # Only scale the part of the chunk on screen
+            area = chunk_rect.clip(visible_rect)
+            size = (math.ceil(area.width * camera.zoom), math.ceil(area.height * camera.zoom))
+            scaled_surface = pygame.transform.scale(chunk_surface.subsurface(area.move(-chunk_rect.x, -chunk_rect.y)), size)
+
+        surface.blit(scaled_surface, (math.floor((area.x - camera.x) * camera.zoom), math.floor((area.y - camera.y) * camera.zoom)))
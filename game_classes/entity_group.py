@@ -0,0 +1,26 @@
+import pygame
+
+
+class EntityGroup(pygame.sprite.Group):
+    def __init__(self, *sprites):
+        """Sprite group that keeps a list of its sprites between changes.
+
+        Group.sprites() and iterating a Group copy the sprites into a new list every time. sprite_list returns the
+        same list until a sprite is added or removed, so per-frame loops don't allocate.
+        """
+        self.sprite_cache = None
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.sprite_cache = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.sprite_cache = None
+
+    def sprite_list(self):
+        """Sprites in the order they were added, shared between calls so it must not be modified"""
+        if self.sprite_cache is None:
+            self.sprite_cache = list(self.spritedict)
+        return self.sprite_cache
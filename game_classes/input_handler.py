@@ -1,4 +1,5 @@
 import pygame
+from game_classes.input_state import input_state
 
 
 class InputHandler:
@@ -46,23 +47,28 @@ class InputHandler:
             "y_button": 3,
         }
 
+    def is_controller(self):
+        """Whether input comes from a controller, Player.apply_input rotates controller input with gravity"""
+        return not isinstance(self.joystick, str)
+
     def get_input(self):
+        # Devices are read from the frame's shared snapshot, so this is cheap to call any number of times
         if self.joystick in ["keyboard_1", "keyboard_2"]:
-            pressed = pygame.key.get_pressed()
+            pressed = input_state.get_pressed()
             binds = self.keyboard_binds_1 if self.joystick == "keyboard_1" else self.keyboard_binds_2
 
             for action in ["jump", "up", "down", "left", "right"]:
                 self.controls[action] = pressed[binds[action]]
 
         else:
-            if not self.joystick.get_init():
+            if not input_state.is_connected(self.joystick):
                 return None
 
             # Get axis values (left analog stick)
-            axis_x = self.joystick.get_axis(self.joystick_binds["left_x_axis"])
-            axis_y = self.joystick.get_axis(self.joystick_binds["left_y_axis"])
+            axis_x = input_state.get_axis(self.joystick, self.joystick_binds["left_x_axis"])
+            axis_y = input_state.get_axis(self.joystick, self.joystick_binds["left_y_axis"])
             # Button press
-            self.controls["jump"] = self.joystick.get_button(self.joystick_binds["a_button"])
+            self.controls["jump"] = input_state.get_button(self.joystick, self.joystick_binds["a_button"])
 
             # Convert analog input to booleans
             self.controls["left"] = axis_x < -self.axis_threshold
@@ -71,3 +77,23 @@ class InputHandler:
             self.controls["down"] = axis_y > self.axis_threshold
 
         return self.controls
+
+
+class ScriptedInputHandler(InputHandler):
+    def __init__(self, script, name="scripted"):
+        """Input handler fed by a script instead of a device, used for headless runs and benchmarks.
+
+        Args:
+            script: Callable taking the tick number and returning a controls dict
+            name: Stands in for the joystick, strings are treated like keyboards by Player.apply_input
+        """
+        super().__init__(name)
+        self.script = script
+        self.tick = 0
+
+    def advance(self):
+        self.tick += 1
+
+    def get_input(self):
+        self.controls.update(self.script(self.tick))
+        return self.controls
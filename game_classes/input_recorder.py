@@ -0,0 +1,169 @@
+import os
+import struct
+import zlib
+from game_classes.input_handler import InputHandler
+
+# === Input log format ===
+# Header, the starting state of every player slot, the zlib-compressed inputs (one byte per slot per tick, tick
+# major) and the player rects after the last tick, all little-endian.
+RECORDING_MAGIC = b"GREC"
+RECORDING_VERSION = 1
+HEADER = struct.Struct("<4sHHHHHHI")  # magic, version, tick rate, player count, world, level, slot count, tick count
+SLOT_STATE = struct.Struct("<ddddiiiiBB")  # location x, y, velocity x, y, rect, on_ground, gravity index
+RECT = struct.Struct("<iiii")
+COMPRESSED_SIZE = struct.Struct("<I")
+GRAVITY_DIRECTIONS = [None, "down", "up", "left", "right"]
+
+# Bits of an input byte
+ACTIONS = ["jump", "up", "down", "left", "right"]  # Bits 0 to 4
+HAS_INPUT = 1 << 5  # The player had a handler that returned controls this tick
+IS_CONTROLLER = 1 << 6  # Controls came from a controller, Player.apply_input rotates them with gravity
+
+
+def _get_slot_state(player):
+    return (
+        *player.location, *player.velocity, *player.rect, player.on_ground,
+        GRAVITY_DIRECTIONS.index(player.gravity_direction)
+    )
+
+
+class InputRecorder:
+    def __init__(self, players, tick_rate, level_info=None):
+        """Records the controls every player used each fixed step, so a run can be replayed exactly.
+
+        Args:
+            players: Players of the level, in sprite order, their current state is where the replay starts
+            tick_rate: Physics steps per second, a replay must use the same rate
+            level_info: Dict with player_count, world and level of the loaded level, None if unknown
+        """
+        level_info = level_info or {"player_count": 0, "world": 0, "level": 0}
+        self.tick_rate = tick_rate
+        self.level = (level_info["player_count"], level_info["world"], level_info["level"])
+        self.start_states = [_get_slot_state(player) for player in players]
+        self.inputs = bytearray()
+        self.tick_count = 0
+
+    def record_tick(self, players):
+        """Call once per fixed step, after Player.apply_input has run for every player"""
+        for player in players[:len(self.start_states)]:
+            inputs = player.last_inputs if player.input_handler else None
+            value = 0
+            if inputs:
+                value = HAS_INPUT
+                for bit, action in enumerate(ACTIONS):
+                    if inputs[action]:
+                        value |= 1 << bit
+                if player.input_handler.is_controller():
+                    value |= IS_CONTROLLER
+            self.inputs.append(value)
+        self.tick_count += 1
+
+    def save(self, path, players):
+        """Write the log, players' rects are stored as the expected result of replaying it"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        compressed = zlib.compress(bytes(self.inputs), 9)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.tick_rate, *self.level, len(self.start_states), self.tick_count))
+            for state in self.start_states:
+                f.write(SLOT_STATE.pack(*state))
+            f.write(COMPRESSED_SIZE.pack(len(compressed)))
+            f.write(compressed)
+            for player in players[:len(self.start_states)]:
+                f.write(RECT.pack(*player.rect))
+        print(f"Recorded {self.tick_count} ticks to {path} ({len(compressed)} bytes of input)")
+        return path
+
+
+class InputLog:
+    def __init__(self, tick_rate, level, start_states, inputs, tick_count, final_rects):
+        self.tick_rate = tick_rate
+        self.level = level  # (player_count, world, level), zeros if the level is unknown
+        self.start_states = start_states
+        self.inputs = inputs
+        self.tick_count = tick_count
+        self.final_rects = final_rects
+
+    @property
+    def slot_count(self):
+        return len(self.start_states)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, version, tick_rate, player_count, world, level, slot_count, tick_count = HEADER.unpack_from(data, 0)
+        if magic != RECORDING_MAGIC:
+            raise ValueError("Not an input recording")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"Unsupported input recording version {version}")
+
+        offset = HEADER.size
+        start_states = []
+        for _ in range(slot_count):
+            start_states.append(SLOT_STATE.unpack_from(data, offset))
+            offset += SLOT_STATE.size
+        (compressed_size,) = COMPRESSED_SIZE.unpack_from(data, offset)
+        offset += COMPRESSED_SIZE.size
+        inputs = zlib.decompress(data[offset:offset + compressed_size])
+        offset += compressed_size
+        final_rects = [RECT.unpack_from(data, offset + i * RECT.size) for i in range(slot_count)]
+
+        if len(inputs) != slot_count * tick_count:
+            raise ValueError("Input recording is truncated")
+        return cls(tick_rate, (player_count, world, level), start_states, inputs, tick_count, final_rects)
+
+    def apply_start_states(self, players):
+        """Put players back in the state they were in when recording started"""
+        for player, state in zip(players, self.start_states):
+            location_x, location_y, velocity_x, velocity_y, x, y, width, height, on_ground, gravity = state
+            player.update_gravity_direction(GRAVITY_DIRECTIONS[gravity])
+            player.rect.update(x, y, width, height)
+            player.future_rect = player.rect.copy()
+            player.previous_rect = player.rect.copy()
+            player.location.update(location_x, location_y)
+            player.velocity.update(velocity_x, velocity_y)
+            player.on_ground = bool(on_ground)
+
+    def attach(self, players):
+        """Give each player a ReplayInputHandler for its slot, returns the handlers"""
+        handlers = []
+        for slot, player in enumerate(players[:self.slot_count]):
+            handler = ReplayInputHandler(self, slot)
+            handler.player = player
+            player.input_handler = handler
+            handlers.append(handler)
+        return handlers
+
+    def matches(self, players):
+        """Whether players ended up exactly where they did when the log was recorded"""
+        return [tuple(player.rect) for player in players[:self.slot_count]] == self.final_rects
+
+
+class ReplayInputHandler(InputHandler):
+    def __init__(self, log, slot):
+        """Input handler that plays back one player slot of an InputLog, a tick per get_input call.
+
+        Player.apply_input calls get_input once per fixed step, so the replay stays in step with the simulation.
+        """
+        super().__init__(f"replay_{slot}")
+        self.log = log
+        self.slot = slot
+        self.tick = 0
+        self.controller = False
+
+    def is_controller(self):
+        return self.controller
+
+    def get_input(self):
+        if self.tick >= self.log.tick_count:
+            return None  # Recording finished
+        value = self.log.inputs[self.tick * self.log.slot_count + self.slot]
+        self.tick += 1
+
+        if not value & HAS_INPUT:
+            return None
+        self.controller = bool(value & IS_CONTROLLER)
+        for bit, action in enumerate(ACTIONS):
+            self.controls[action] = bool(value & (1 << bit))
+        return self.controls
@@ -0,0 +1,84 @@
+import pygame
+
+
+class InputState:
+    def __init__(self):
+        """Keyboard and joystick state read once per frame and shared by every input consumer.
+
+        The keyboard is read the first time it is asked for each frame. Joysticks are read in full when they are
+        connected, then kept up to date from axis and button events, so nothing polls the devices directly.
+        """
+        self.keys = None  # pygame.key.get_pressed() of this frame, None until first asked for
+        self.joysticks = {}  # instance id -> pygame.joystick.Joystick
+        self.axes = {}  # instance id -> list of axis values
+        self.buttons = {}  # instance id -> list of button states
+
+        # Devices connected and disconnected this frame
+        self.added = []  # Joysticks
+        self.removed = []  # Joysticks, already unusable
+
+    def begin_frame(self, events):
+        """Start a new frame, call once per frame with all of its events before any input is read"""
+        self.keys = None
+        self.added = []
+        self.removed = []
+
+        for event in events:
+            if event.type == pygame.JOYAXISMOTION:
+                axes = self.axes.get(event.instance_id)
+                if axes is not None and event.axis < len(axes):
+                    axes[event.axis] = event.value
+            elif event.type in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP):
+                buttons = self.buttons.get(event.instance_id)
+                if buttons is not None and event.button < len(buttons):
+                    buttons[event.button] = event.type == pygame.JOYBUTTONDOWN
+            elif event.type == pygame.JOYDEVICEADDED:
+                joystick = self.add_joystick(pygame.joystick.Joystick(event.device_index))
+                if joystick:
+                    self.added.append(joystick)
+            elif event.type == pygame.JOYDEVICEREMOVED:
+                joystick = self.remove_joystick(event.instance_id)
+                if joystick:
+                    self.removed.append(joystick)
+
+    def scan_joysticks(self):
+        """Register every joystick already connected, returns all registered joysticks"""
+        for i in range(pygame.joystick.get_count()):
+            self.add_joystick(pygame.joystick.Joystick(i))
+        return list(self.joysticks.values())
+
+    def add_joystick(self, joystick):
+        """Start tracking joystick, reading its current state. Returns None if it was already tracked."""
+        instance_id = joystick.get_instance_id()
+        if instance_id in self.joysticks:
+            return None
+        self.joysticks[instance_id] = joystick
+        self.axes[instance_id] = [joystick.get_axis(i) for i in range(joystick.get_numaxes())]
+        self.buttons[instance_id] = [bool(joystick.get_button(i)) for i in range(joystick.get_numbuttons())]
+        return joystick
+
+    def remove_joystick(self, instance_id):
+        self.axes.pop(instance_id, None)
+        self.buttons.pop(instance_id, None)
+        return self.joysticks.pop(instance_id, None)
+
+    def get_pressed(self):
+        """Keyboard state of this frame, like pygame.key.get_pressed()"""
+        if self.keys is None:
+            self.keys = pygame.key.get_pressed()
+        return self.keys
+
+    def is_connected(self, joystick):
+        return any(tracked is joystick for tracked in self.joysticks.values())
+
+    def get_axis(self, joystick, axis):
+        axes = self.axes.get(joystick.get_instance_id(), ())
+        return axes[axis] if axis < len(axes) else 0.0
+
+    def get_button(self, joystick, button):
+        buttons = self.buttons.get(joystick.get_instance_id(), ())
+        return buttons[button] if button < len(buttons) else False
+
+
+# Shared by every InputHandler and Camera, GameApp feeds it each frame's events
+input_state = InputState()
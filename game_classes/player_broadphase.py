@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+
+
+class SweepAndPrune:
+    def __init__(self):
+        """Broadphase for players (the moving bodies), kept apart from the static block index.
+
+        Rebuilt once per fixed step from the players' rects, sorted by where they start on the sweep axis. That
+        axis is perpendicular to most players' gravity, the direction they spread out in along floors, so a query
+        only has to look at the short run of players whose span on it can reach the search area.
+        """
+        self.players = []
+        self.axis = 0  # 0 sweeps along x, 1 along y
+        self.indices = []  # Indices into players, sorted by where their rects start on the sweep axis
+        self.starts = []  # Start of each rect in indices order
+        self.max_extent = 0  # Longest player rect on the sweep axis
+        self.hits = []  # Scratch list reused by query_into
+        self.candidate_count = 0  # Players tested by queries since the last rebuild, for profiling
+
+    def rebuild(self, players):
+        """Sort players along the sweep axis, call once per step before any query"""
+        self.players = players
+        horizontal = sum(1 for player in players if player.gravity_vector.x != 0)
+        vertical = sum(1 for player in players if player.gravity_vector.y != 0)
+        self.axis = axis = 1 if horizontal > vertical else 0
+
+        # Players move little between steps, so last step's order is nearly sorted already and sorts quickly
+        if len(self.indices) != len(players):
+            self.indices = list(range(len(players)))
+        self.indices.sort(key=lambda index: players[index].rect[axis])
+        self.starts.clear()
+        self.starts.extend(players[index].rect[axis] for index in self.indices)
+        self.max_extent = max((player.rect[axis + 2] for player in players), default=0)
+        self.candidate_count = 0
+
+    def query(self, search_rect, exclude=None):
+        """Rects of the players other than exclude overlapping search_rect, in the order players were given in"""
+        found = []
+        self.query_into(search_rect, exclude, found)
+        return found
+
+    def query_into(self, search_rect, exclude, out):
+        """Like query but appends the rects to out instead of returning a new list"""
+        axis = self.axis
+        search_start = search_rect[axis]
+        search_end = search_start + search_rect[axis + 2]
+
+        # Only rects starting in this range can reach into the search area on the sweep axis
+        first = bisect_right(self.starts, search_start - self.max_extent)
+        last = bisect_left(self.starts, search_end)
+        self.candidate_count += last - first
+
+        players = self.players
+        indices = self.indices
+        hits = self.hits
+        for position in range(first, last):
+            index = indices[position]
+            if players[index] is not exclude and search_rect.colliderect(players[index].rect):
+                hits.append(index)
+        hits.sort()  # Collision response resolves ties by list order, keep it independent of the sweep order
+        for index in hits:
+            out.append(players[index].rect)
+        hits.clear()
+
+
+class AllPlayers:
+    def __init__(self):
+        """Tests every player against every other, O(players^2) per step. For comparison in benchmarks."""
+        self.players = []
+        self.candidate_count = 0
+
+    def rebuild(self, players):
+        self.players = players
+        self.candidate_count = 0
+
+    def query(self, search_rect, exclude=None):
+        found = []
+        self.query_into(search_rect, exclude, found)
+        return found
+
+    def query_into(self, search_rect, exclude, out):
+        self.candidate_count += len(self.players)
+        for player in self.players:
+            if player is not exclude and search_rect.colliderect(player.rect):
+                out.append(player.rect)
+
+
+# Broadphases selectable in benchmarks, name -> class
+PLAYER_BROADPHASES = {
+    "sweep": SweepAndPrune,
+    "all": AllPlayers
+}
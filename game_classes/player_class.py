@@ -1,5 +1,6 @@
 import math
 import pygame
+from game_classes.scaled_image_cache import ScaledImageCache
 
 
 class Player(pygame.sprite.Sprite):
@@ -17,11 +18,14 @@ class Player(pygame.sprite.Sprite):
         self.image = pygame.image.load("assets/player.png")  # .convert_alpha()
         self.image = pygame.transform.scale(self.image, image_size)
         self.unrotated_image = self.image.copy()
+        self.scaled_images = ScaledImageCache()
 
         self.collision_box_size = pygame.Vector2((image_size[0], image_size[1] * 2 / 3))  # base size for collision rects
         self.rect = pygame.Rect((0, 0), self.collision_box_size)
         self.rect.center = position
         self.future_rect = self.rect.copy()  # Used for collision prediction or pathing
+        self.previous_rect = self.rect.copy()  # Rect before the last physics step, used for interpolation
+        self.interpolation = 1.0  # Fraction of the way from previous_rect to rect to draw at
 
         # === Static Player Settings ===
         self.speed = 180  # Movement speed
@@ -32,6 +36,7 @@ class Player(pygame.sprite.Sprite):
         # === Input Handling ===
         self.input_handler = None
         self.controls = None
+        self.last_inputs = None  # Controls used by the last apply_input, None if the handler gave none
 
         # === Gravity ===
         self.gravity_vector = pygame.Vector2(0, 0)
@@ -42,6 +47,13 @@ class Player(pygame.sprite.Sprite):
         self.location = pygame.Vector2(self.rect.x, self.rect.y)  # Sub-pixel location tracking
         self.velocity = pygame.Vector2(0, 0)  # Current movement vector
         self.on_ground = False  # For gravity/jumping logic
+        self.collision_candidates = 0  # Rects tested by the last calc_next_pos, for profiling
+
+        # === Scratch objects reused every physics step instead of allocating new ones ===
+        self.search_rect = pygame.Rect(0, 0, 0, 0)
+        self.check_rect = pygame.Rect(0, 0, 0, 0)
+        self.nearby_blocks = []
+        self.rect_list = []
 
     def is_flying(self):
         return self.gravity_vector.length() == 0
@@ -63,7 +75,14 @@ class Player(pygame.sprite.Sprite):
         if self.gravity_vector.length_squared() > self.gravity_strength:
             self.gravity_vector = self.gravity_vector.normalize() * self.gravity_strength
 
+        # One pixel towards gravity, where a rect means the player is standing on something
+        self.ground_offset = None
+        if self.gravity_vector.length_squared() > 0:
+            check_offset = self.gravity_vector.normalize()
+            self.ground_offset = (round(check_offset.x), round(check_offset.y))
+
         # Handle rotation
+        self.scaled_images.clear()
         if self.gravity_vector.x < 0:  # Left
             self.image = pygame.transform.rotate(self.unrotated_image, -90)
         elif self.gravity_vector.x > 0:  # Right
@@ -83,17 +102,19 @@ class Player(pygame.sprite.Sprite):
         self.rect = pygame.Rect(0, 0, width, height)
         self.rect.center = old_center
         self.future_rect = self.rect.copy()
+        self.previous_rect = self.rect.copy()  # Don't interpolate across a size change
 
     def apply_input(self, delta_time):
         if not self.input_handler:
             return
 
         inputs = self.input_handler.get_input()
+        self.last_inputs = inputs
         if not inputs:
             return
 
         # Rotate inputs for gravity for controller players
-        if not isinstance(self.input_handler.joystick, str):
+        if self.input_handler.is_controller():
             if self.gravity_vector.x != 0 and self.gravity_vector is not None:
                 inputs["left"], inputs["right"] = inputs["up"], inputs["down"]
 
@@ -128,7 +149,14 @@ class Player(pygame.sprite.Sprite):
             elif inputs["left"] and not inputs["right"]:
                 self.location.x -= self.speed * delta_time
 
-    def calc_next_pos(self, delta_time, sprites):
+    def calc_next_pos(self, delta_time, block_index, player_broadphase):
+        """Integrate gravity and velocity, then resolve collisions into future_rect.
+
+        Args:
+            delta_time: Seconds to simulate
+            block_index: SpatialHash of the level's static blocks
+            player_broadphase: SweepAndPrune rebuilt this step, other players are treated as solid
+        """
         self.velocity += self.gravity_vector * delta_time
 
         # Update location
@@ -138,110 +166,130 @@ class Player(pygame.sprite.Sprite):
         # Move future_rect to location using math.floor for consistent rounding
         self.future_rect.topleft = (round(self.location.x), round(self.location.y))
 
-        # Filter nearby rects and cache calculations for better performance
-        search_rect = self.future_rect.inflate(self.rect.width * 2, self.rect.height * 2)
-        rect_list = [sprite.rect for sprite in sprites if sprite != self and search_rect.colliderect(sprite.rect)]
+        # Filter nearby rects, the search covers the whole move so fast players cannot skip over a block
+        search_rect = self.search_rect
+        search_rect.update(self.rect)
+        search_rect.union_ip(self.future_rect)
+        search_rect.inflate_ip(self.rect.width * 2, self.rect.height * 2)
+        block_index.query_into(search_rect, self.nearby_blocks)
+        rect_list = self.rect_list
+        rect_list.clear()
+        for block in self.nearby_blocks:
+            rect_list.append(block.rect)
+        player_broadphase.query_into(search_rect, self, rect_list)
+        self.collision_candidates = len(rect_list)
 
         if not rect_list:  # Quick exit if no nearby collisions
             return
 
-        while self.future_rect.collidelist(rect_list) >= 0 and self.future_rect.topleft != self.rect.topleft:
-            dx = self.future_rect.centerx - self.rect.centerx
-            dy = self.future_rect.centery - self.rect.centery
-
-            # Binary search to find closest non-colliding position (this aims to improve efficiency)
-            test_rect = self.future_rect.copy()
-            step_x = dx // 2
-            step_y = dy // 2
-            while abs(step_x) > 1 or abs(step_y) > 1:
-                test_rect.centerx = self.rect.centerx + step_x
-                test_rect.centery = self.rect.centery + step_y
-
-                if not test_rect.collidelist(rect_list) >= 0:
-                    self.future_rect = test_rect.copy()
-                    dx = step_x
-                    dy = step_y
-
-                step_x //= 2
-                step_y //= 2
-
-            # Use independent rects for final adjustments
-            future_rect_x = self.future_rect.copy()
-            future_rect_x.y = self.rect.y  # Rect with only x offset
-            future_rect_y = self.future_rect.copy()
-            future_rect_y.x = self.rect.x  # Rect with only y offset
-
-            # Start looping over block rects
-            for collision_rect in rect_list:
-                # Check if the future_rect collides with the current block
-                if self.future_rect.colliderect(collision_rect):
-                    # If neither axis is colliding, we cannot handle them separately.
-                    # This approach steps back the future_rect perfectly diagonally (until one axis aligns with rect x or y, then future rect moves along one axis).
-                    # The above line may be cut short if any step of future_rect is not colliding.
-                    # This approach is more efficient than the one below but less ideal. For example, y movement would be reduced when hitting a vertical wall.
-                    if not future_rect_x.colliderect(collision_rect) and not future_rect_y.colliderect(collision_rect):
-                        for i in range(max(abs(dx), abs(dy))):
-                            # Check collision to see if we can stop stepping back here
-                            if self.future_rect.colliderect(collision_rect):
-                                self.velocity = pygame.Vector2(0, 0)  # Reset velocity
-                                # move future rect toward rect by 1
-                                dx, dy = self.future_rect.centerx - self.rect.centerx, self.future_rect.centery - self.rect.centery
-                                if dx != 0:
-                                    self.future_rect.x -= dx // abs(dx)
-                                if dy != 0:
-                                    self.future_rect.y -= dy // abs(dy)
-                        continue
-
-                    # If one axis is colliding, we can handle it separately.
-                    # This approach steps back the future_rect perfectly along one axis until it meets rect or is not colliding anymore.
-                    for i in range(abs(dx)):
-                        # Check collision first because this axis may not be colliding at all
-                        if future_rect_x.colliderect(collision_rect):
-                            self.velocity.x = 0  # Reset velocity
-                            # move future rect toward rect by 1
-                            dx = future_rect_x.centerx - self.rect.centerx
-                            if dx != 0:
-                                future_rect_x.x -= dx // abs(dx)
-                    # Repeat for y
-                    for i in range(abs(dy)):
-                        if future_rect_y.colliderect(collision_rect):
-                            self.velocity.y = 0
-                            dy = future_rect_y.centery - self.rect.centery
-                            if dy != 0:
-                                future_rect_y.y -= dy // abs(dy)
-
-                    # Update player's future_rect
-                    self.future_rect.topleft = (future_rect_x.x, future_rect_y.y)
-
-                    # Restart checking collisions with blocks once future_rect has been updated
-                    # because all calcs for previous blocks are now outdated.
-                    break
+        self.resolve_collisions(rect_list)
+
+    def resolve_collisions(self, rect_list):
+        """Move future_rect from rect towards its integrated position without overlapping any rect in rect_list,
+        then update location, velocity and on_ground to match"""
+        # Sweep from the current rect towards the future position
+        move = (self.future_rect.x - self.rect.x, self.future_rect.y - self.rect.y)
+        self.future_rect.topleft = self.rect.topleft
+
+        # Move along the axis parallel to the first surface hit (slide), then along the axis that hits it (stop).
+        # Each axis move is clamped analytically so the result never overlaps a rect, whatever the distance moved.
+        if self._get_impact_axis(self.future_rect, move, rect_list) == 0:
+            axis_order = (1, 0)
+        else:
+            axis_order = (0, 1)
+
+        for axis in axis_order:
+            if move[axis] == 0:
+                continue
+            allowed = self._clamp_move(self.future_rect, move[axis], axis, rect_list)
+            if allowed != move[axis]:
+                self.velocity[axis] = 0  # Reset velocity on the blocked axis
+            self.future_rect[axis] += allowed
 
         # After adjustments, update location
-        self.location = pygame.Vector2(self.future_rect.topleft)
+        self.location.update(self.future_rect.topleft)
 
         # === Update on_ground status based on gravity ===
         self.on_ground = False  # Reset to default
-        if not self.is_flying():
-            check_offset = pygame.Vector2(self.gravity_vector).normalize()
-            check_rect = self.rect.move(round(check_offset.x), round(check_offset.y))
+        if self.ground_offset:
+            check_rect = self.check_rect
+            check_rect.update(self.rect)
+            check_rect.move_ip(self.ground_offset)
 
             for rect in rect_list:
                 if check_rect.colliderect(rect):
                     self.on_ground = True
                     break
 
+    @staticmethod
+    def _get_overlap_times(start, end, obstacle_start, obstacle_end, delta):
+        """Fractions of a 1D move at which the span [start, end) enters and leaves [obstacle_start, obstacle_end)"""
+        if delta > 0:
+            return (obstacle_start - end) / delta, (obstacle_end - start) / delta
+        if delta < 0:
+            return (obstacle_end - start) / delta, (obstacle_start - end) / delta
+        if start < obstacle_end and obstacle_start < end:
+            return -math.inf, math.inf  # Always overlapping on this axis
+        return math.inf, -math.inf  # Never overlapping on this axis
+
+    def _get_impact_axis(self, rect, move, rect_list):
+        """Swept AABB test of rect moving by move.
+
+        Returns:
+            Axis (0 for x, 1 for y) of the first surface hit, None if the move is unobstructed
+        """
+        first_entry = 1.0
+        impact_axis = None
+        for collision_rect in rect_list:
+            x_entry, x_exit = self._get_overlap_times(rect.left, rect.right, collision_rect.left, collision_rect.right, move[0])
+            y_entry, y_exit = self._get_overlap_times(rect.top, rect.bottom, collision_rect.top, collision_rect.bottom, move[1])
+            entry = max(x_entry, y_entry)
+            # Skip rects that are never entered, already overlapped or hit later than the current first hit
+            if entry >= min(x_exit, y_exit) or entry < 0 or entry >= first_entry:
+                continue
+            first_entry = entry
+            impact_axis = 0 if x_entry > y_entry else 1
+        return impact_axis
+
+    @staticmethod
+    def _clamp_move(rect, delta, axis, rect_list):
+        """Largest part of delta rect can move along axis (0 for x, 1 for y) before touching a rect in rect_list"""
+        other = 1 - axis
+        start, end = rect[axis], rect[axis] + rect[axis + 2]
+        other_start, other_end = rect[other], rect[other] + rect[other + 2]
+        for collision_rect in rect_list:
+            # Only rects overlapping on the other axis can be hit
+            if collision_rect[other] >= other_end or collision_rect[other] + collision_rect[other + 2] <= other_start:
+                continue
+            if delta > 0 and collision_rect[axis] >= end:
+                delta = min(delta, collision_rect[axis] - end)
+            elif delta < 0 and collision_rect[axis] + collision_rect[axis + 2] <= start:
+                delta = max(delta, collision_rect[axis] + collision_rect[axis + 2] - start)
+        return delta
+
     def apply_next_pos(self):
-        self.rect = self.future_rect.copy()
+        # Copied in place so a step doesn't allocate new rects
+        self.previous_rect.update(self.rect)
+        self.rect.update(self.future_rect)
+
+    def get_bounds(self):
+        """Area of the game world this player draws into, the image is larger than the collision rect.
+        Positioned between previous_rect and rect by interpolation so movement is smooth at any frame rate."""
+        center = (
+            self.previous_rect.centerx + (self.rect.centerx - self.previous_rect.centerx) * self.interpolation,
+            self.previous_rect.centery + (self.rect.centery - self.previous_rect.centery) * self.interpolation
+        )
+        return self.image.get_rect(center=center)
 
     def get_display_rect(self, camera):
+        image_rect = self.get_bounds()
         return pygame.Rect(
-            (self.image.get_rect(center=self.rect.center).x - camera.x) * camera.zoom,
-            (self.image.get_rect(center=self.rect.center).y - camera.y) * camera.zoom,
+            (image_rect.x - camera.x) * camera.zoom,
+            (image_rect.y - camera.y) * camera.zoom,
             self.image.get_width() * camera.zoom,
             self.image.get_height() * camera.zoom
         )
 
     def draw(self, surface, camera):
-        scaled_image = pygame.transform.scale(self.image, self.get_display_rect(camera).size)
+        scaled_image = self.scaled_images.get_scaled(self.image, camera.zoom)
         surface.blit(scaled_image, self.get_display_rect(camera))
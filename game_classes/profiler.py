@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+import pygame
+from game_classes.scaled_image_cache import ScaledImageCache
+from game_classes.tile_cache import tile_cache
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+
+
+def _hit_rate(hits, misses):
+    return hits / (hits + misses) if hits + misses else None
+
+
+class FrameProfiler:
+    def __init__(self, window=600, history=3600):
+        """Records how long each phase of a frame takes, plus a few counters, and keeps rolling statistics.
+
+        Args:
+            window: Frames the rolling percentiles are taken over
+            history: Frames kept for dump
+        """
+        self.window = window
+        self.samples = {}  # Metric name -> deque of the last window values
+        self.history = deque(maxlen=history)  # One dict per frame, oldest first
+        self.phases = {}  # Phase name -> reusable _Phase context manager
+
+        self.frame = {}  # Metrics of the frame being measured
+        self.frame_start = None
+        self.frame_count = 0
+        self.startup_times = {}  # Startup step -> milliseconds since launch, filled in by GameApp
+
+        # === Overlay ===
+        self.show_overlay = False
+        self.overlay_surface = None
+        self.overlay_rect = None  # Screen area the overlay was last drawn to
+        self.overlay_changed = False
+        self.overlay_refresh_frames = 30  # Percentiles are recalculated this often while the overlay is shown
+        self.font = None
+
+    def phase(self, name):
+        """Context manager adding the time spent inside it to name for the current frame"""
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def add_time(self, name, seconds):
+        self.frame[name] = self.frame.get(name, 0.0) + seconds * 1000
+
+    def set_counter(self, name, value):
+        self.frame[name] = value
+
+    def begin_frame(self):
+        self.frame = {}
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self, state=None):
+        """Finish the frame, collecting counters from state (the top state) and the image caches"""
+        if self.frame_start is None:
+            return
+        self.frame["frame"] = (time.perf_counter() - self.frame_start) * 1000
+        if state:
+            self.collect_state_counters(state)
+        self.collect_cache_counters()
+
+        for name, value in self.frame.items():
+            if value is None:
+                continue
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(value)
+
+        self.frame["frame_index"] = self.frame_count
+        self.history.append(self.frame)
+        self.frame_count += 1
+        self.frame_start = None
+
+        if self.show_overlay and self.frame_count % self.overlay_refresh_frames == 0:
+            self.overlay_surface = None
+            self.overlay_changed = True
+
+    def collect_state_counters(self, state):
+        game_sprites = getattr(state, "game_sprites", None)
+        if game_sprites:
+            for name, group in game_sprites.items():
+                self.set_counter(f"sprites:{name}", len(group))
+        if hasattr(state, "collision_candidates"):
+            self.set_counter("collision_candidates", state.collision_candidates)
+        render_stats = getattr(state, "render_stats", None)
+        if render_stats:
+            self.set_counter("sprites_drawn", render_stats["drawn"])
+            self.set_counter("sprites_culled", render_stats["culled"])
+        chunk_layer = getattr(state, "chunk_layer", None)
+        if chunk_layer:
+            self.set_counter("chunks_drawn", chunk_layer.draw_stats["drawn"])
+
+    def collect_cache_counters(self):
+        # Hit rates since startup
+        stats = tile_cache.get_stats()
+        self.set_counter("tile_cache_hit_rate", _hit_rate(stats["hits"], stats["misses"]))
+        self.set_counter("scaled_image_hit_rate", _hit_rate(ScaledImageCache.total_hits, ScaledImageCache.total_misses))
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """Nearest-rank percentiles of the last window values of name"""
+        values = sorted(self.samples.get(name, ()))
+        if not values:
+            return {f"p{point}": None for point in points}
+        return {f"p{point}": values[min(len(values) - 1, len(values) * point // 100)] for point in points}
+
+    def get_summary(self):
+        """Rolling statistics of every metric, name -> {"p50", "p95", "p99", "mean", "max"}"""
+        summary = {}
+        for name, values in self.samples.items():
+            summary[name] = self.percentiles(name)
+            summary[name]["mean"] = sum(values) / len(values)
+            summary[name]["max"] = max(values)
+        return summary
+
+    def dump(self, path):
+        """Write the recorded frames to path, CSV if it ends in .csv, otherwise JSON with a summary included"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if path.endswith(".csv"):
+            columns = ["frame_index"]
+            for frame in self.history:
+                columns += [name for name in frame if name not in columns]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, columns)
+                writer.writeheader()
+                writer.writerows(self.history)
+        else:
+            with open(path, "w") as f:
+                json.dump({"startup": self.startup_times, "summary": self.get_summary(), "frames": list(self.history)}, f, indent=4)
+        print(f"Profile saved to {path}")
+        return path
+
+    def get_overlay_lines(self):
+        """Statistics of the metrics recorded last frame, formatted for the overlay"""
+        lines = []
+        for name, stats in self.get_summary().items():
+            if name not in self.frame:
+                continue  # e.g. timings of a state that is no longer shown
+            if name.endswith("_hit_rate"):
+                lines.append(f"{name:<28} {stats['p50']:6.1%}")
+            elif name.startswith("sprites") or name.startswith("chunks") or name == "collision_candidates":
+                lines.append(f"{name:<28} {stats['p50']:6.0f}")
+            else:
+                lines.append(f"{name:<28} p50 {stats['p50']:6.2f}  p95 {stats['p95']:6.2f}  p99 {stats['p99']:6.2f} ms")
+        return lines
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.overlay_surface = None
+        self.overlay_changed = True
+
+    def get_dirty_rects(self, surface):
+        """Screen area of the overlay if it needs redrawing (or erasing), for dirty-rect rendering"""
+        if not self.overlay_changed:
+            return []
+        self.overlay_changed = False
+        # Covers the old overlay so a shrunk or hidden overlay is erased, and the new one, which is at most this tall
+        return [pygame.Rect(0, 0, surface.get_width() // 2, surface.get_height())]
+
+    def draw(self, surface):
+        if not self.show_overlay:
+            return
+
+        # Text is only re-rendered when the statistics are refreshed
+        if self.overlay_surface is None:
+            if self.font is None:
+                self.font = pygame.font.Font(None, 18)
+            lines = self.get_overlay_lines()
+            line_height = self.font.get_linesize()
+            self.overlay_surface = pygame.Surface((surface.get_width() // 2, line_height * len(lines) + 8), pygame.SRCALPHA)
+            self.overlay_surface.fill((0, 0, 0, 160))
+            for i, line in enumerate(lines):
+                self.overlay_surface.blit(self.font.render(line, True, "white"), (4, 4 + i * line_height))
+
+        surface.blit(self.overlay_surface, (0, 0))
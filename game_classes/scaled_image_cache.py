@@ -0,0 +1,45 @@
+import math
+from collections import OrderedDict
+import pygame
+
+
+class ScaledImageCache:
+    # Totals across every cache, used for profiling
+    total_hits = 0
+    total_misses = 0
+
+    def __init__(self, max_entries=3, zoom_steps=1000, round_up=False):
+        """Least-recently-used cache of scaled copies of a sprite image keyed by the quantized zoom level.
+
+        Args:
+            max_entries: Number of zoom levels kept before the least recently used one is evicted
+            zoom_steps: Zoom is rounded to 1 / zoom_steps so float drift while zooming maps to the same entry
+            round_up: Round scaled sizes up instead of down, so images drawn edge to edge leave no gaps
+        """
+        self.entries = OrderedDict()  # quantized zoom -> scaled surface
+        self.max_entries = max_entries
+        self.zoom_steps = zoom_steps
+        self.round_up = round_up
+
+    def quantize(self, zoom):
+        return round(zoom * self.zoom_steps) / self.zoom_steps
+
+    def get_scaled(self, image, zoom):
+        key = self.quantize(zoom)
+        scaled_image = self.entries.get(key)
+        if scaled_image is not None:
+            self.entries.move_to_end(key)
+            ScaledImageCache.total_hits += 1
+            return scaled_image
+
+        ScaledImageCache.total_misses += 1
+        rounding = math.ceil if self.round_up else int
+        size = (rounding(image.get_width() * key), rounding(image.get_height() * key))
+        scaled_image = pygame.transform.scale(image, size)
+        self.entries[key] = scaled_image
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return scaled_image
+
+    def clear(self):
+        self.entries.clear()
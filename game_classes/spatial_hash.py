@@ -0,0 +1,109 @@
+class SpatialHash:
+    def __init__(self, cell_size):
+        """Uniform grid index of static sprites for fast area queries.
+
+        Sprites are bucketed into every cell their rect covers. Moving or resizing a sprite requires update().
+
+        Args:
+            cell_size: Width and height of a cell in world pixels, should be a multiple of the grid size
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (cell_x, cell_y) -> list of sprites
+        self.sprite_cells = {}  # sprite -> cell keys it is stored in
+        self.insert_order = {}  # sprite -> insertion counter, keeps query results in a stable order
+        self.insert_count = 0
+        self.version = 0  # Bumped on every change, so copies of the index can tell when they are stale
+        self.query_seen = set()  # Scratch set reused by query_into
+
+    def __len__(self):
+        return len(self.sprite_cells)
+
+    def __contains__(self, sprite):
+        return sprite in self.sprite_cells
+
+    def get_cell_keys(self, rect):
+        left = rect.left // self.cell_size
+        top = rect.top // self.cell_size
+        right = (max(rect.right, rect.left + 1) - 1) // self.cell_size
+        bottom = (max(rect.bottom, rect.top + 1) - 1) // self.cell_size
+        return tuple((x, y) for x in range(left, right + 1) for y in range(top, bottom + 1))
+
+    def insert(self, sprite):
+        if sprite in self.sprite_cells:
+            self.update(sprite)
+            return
+
+        keys = self.get_cell_keys(sprite.rect)
+        for key in keys:
+            self.cells.setdefault(key, []).append(sprite)
+        self.sprite_cells[sprite] = keys
+        self.insert_order[sprite] = self.insert_count
+        self.insert_count += 1
+        self.version += 1
+
+    def remove(self, sprite):
+        keys = self.sprite_cells.pop(sprite, None)
+        if keys is None:
+            return
+        del self.insert_order[sprite]
+        self.version += 1
+
+        for key in keys:
+            cell = self.cells[key]
+            cell.remove(sprite)
+            if not cell:
+                del self.cells[key]
+
+    def update(self, sprite):
+        """Re-bucket a sprite after its rect has moved or changed size"""
+        keys = self.get_cell_keys(sprite.rect)
+        old_keys = self.sprite_cells.get(sprite)
+        if old_keys == keys:
+            self.version += 1  # Same cells, but the rect still changed
+            return
+
+        order = self.insert_order.get(sprite)
+        self.remove(sprite)
+        self.insert(sprite)
+        if order is not None:
+            self.insert_order[sprite] = order
+
+    def rebuild(self, sprites):
+        self.clear()
+        for sprite in sprites:
+            self.insert(sprite)
+
+    def clear(self):
+        self.cells.clear()
+        self.sprite_cells.clear()
+        self.insert_order.clear()
+        self.insert_count = 0
+        self.version += 1
+
+    def query(self, rect):
+        """Return sprites whose rect collides with rect, in insertion order"""
+        found = []
+        self.query_into(rect, found)
+        return found
+
+    def query_into(self, rect, out):
+        """Like query but fills out (cleared first) instead of returning a new list, for loops run every tick"""
+        out.clear()
+        seen = self.query_seen
+        cell_size = self.cell_size
+        left = rect.left // cell_size
+        top = rect.top // cell_size
+        right = (max(rect.right, rect.left + 1) - 1) // cell_size
+        bottom = (max(rect.bottom, rect.top + 1) - 1) // cell_size
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell:
+                    for sprite in cell:
+                        if sprite not in seen and rect.colliderect(sprite.rect):
+                            seen.add(sprite)
+                            out.append(sprite)
+        seen.clear()  # Don't keep sprites alive until the next query
+
+        if len(out) > 1:
+            out.sort(key=self.insert_order.__getitem__)
@@ -0,0 +1,221 @@
+import os
+import pygame
+
+# Colours blocks can be tinted with
+COLOR_MAP = {
+    "blue": (70, 90, 140),
+    "red": (150, 60, 60),
+    "green": (80, 120, 80),
+    "yellow": (200, 180, 100),
+    "orange": (200, 130, 70),
+    "purple": (100, 70, 120),
+    "cyan": (100, 160, 160),
+    "white": (240, 240, 240),
+    "black": (20, 20, 20),
+    "gray": (100, 100, 100),
+    "magenta": (160, 90, 130)
+}
+
+# Base images every tile variant is derived from
+BASE_IMAGES = {
+    "corner": "assets/tiles/corner.png",
+    "edge": "assets/tiles/edge.png",
+    "center": "assets/tiles/center.png"
+}
+
+# Define how to derive each tile from the base image and its rotation
+TILE_VARIANTS = {
+    "top-left": ("corner", 0),
+    "top": ("edge", 0),
+    "top-right": ("corner", -90),
+    "left": ("edge", 90),
+    "center": ("center", 0),
+    "right": ("edge", -90),
+    "bottom-left": ("corner", 90),
+    "bottom": ("edge", 180),
+    "bottom-right": ("corner", 180),
+}
+
+# Width and height in tiles of the reference block each colour has in the tile atlas
+ATLAS_BLOCK_TILES = 10
+
+
+def _get_tile_spans(tile_count):
+    """Split a row or column of tile_count tiles into runs drawn from the atlas reference block.
+
+    Returns:
+        List of (first tile, first reference block tile, tile count)
+    """
+    if tile_count <= 0:
+        return []
+    if tile_count == 1:
+        return [(0, 0, 1)]
+    inner = ATLAS_BLOCK_TILES - 2
+    spans = [(0, 0, 1)]
+    for start in range(1, tile_count - 1, inner):
+        spans.append((start, 1, min(inner, tile_count - 1 - start)))
+    spans.append((tile_count - 1, ATLAS_BLOCK_TILES - 1, 1))
+    return spans
+
+
+class TileCache:
+    def __init__(self):
+        """Process-wide cache of tinted block tiles keyed by (grid_size, color, variant).
+
+        Each base image is read from disk once, tinted variants are built the first time they are requested.
+        """
+        self.base_images = {}  # base_name -> loaded surface, None if the file is missing
+        self.tiles = {}  # (grid_size, color, variant) -> tinted surface
+        self.atlases = {}  # grid_size -> atlas surface of every tinted tile of that size
+        self.atlas_origins = {}  # (grid_size, color) -> top left of that colour's reference block in the atlas
+        self.block_tiles = {}  # (grid_size, color, tiles_x, tiles_y) -> tile list, see get_block_tiles
+
+        # === Statistics ===
+        self.hits = 0
+        self.misses = 0
+        self.file_reads = 0
+
+    def _get_base_image(self, base_name):
+        if base_name not in self.base_images:
+            path = BASE_IMAGES[base_name]
+            if os.path.exists(path):
+                self.file_reads += 1
+                self.base_images[base_name] = pygame.image.load(path).convert_alpha()
+            else:
+                print(f"Base image '{path}' not found. Using placeholder for '{base_name}' tiles.")
+                self.base_images[base_name] = None
+        return self.base_images[base_name]
+
+    def get_tile(self, grid_size, color, variant):
+        key = (grid_size, color, variant)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.hits += 1
+            return tile
+
+        self.misses += 1
+        base_name, rotation = TILE_VARIANTS[variant]
+        base_image = self._get_base_image(base_name)
+        if base_image:
+            tile = pygame.transform.scale(base_image, (grid_size, grid_size))
+            if rotation != 0:
+                tile = pygame.transform.rotate(tile, rotation)
+            tile.fill(COLOR_MAP.get(color, COLOR_MAP["blue"]), special_flags=pygame.BLEND_RGBA_MULT)
+        else:
+            tile = pygame.Surface((grid_size, grid_size), pygame.SRCALPHA).convert_alpha()
+            tile.fill((255, 0, 0, 128))
+
+        self.tiles[key] = tile
+        return tile
+
+    def get_atlas(self, grid_size):
+        """Surface holding the tinted tiles of grid_size for every colour used so far"""
+        return self.atlases.get(grid_size)
+
+    def _get_atlas_origin(self, grid_size, color):
+        """Top left of the colour's reference block in the atlas, the colour is packed in on first use"""
+        key = (grid_size, color)
+        origin = self.atlas_origins.get(key)
+        if origin is None:
+            origin = self._add_to_atlas(grid_size, color)
+        return origin
+
+    def _add_to_atlas(self, grid_size, color):
+        # Each colour gets a reference block of ATLAS_BLOCK_TILES square, laid out with the usual tiling rules.
+        # Any block can be drawn from its corners, edge strips and centre.
+        block_size = ATLAS_BLOCK_TILES * grid_size
+        old_atlas = self.atlases.get(grid_size)
+        origin = (old_atlas.get_width() if old_atlas else 0, 0)
+
+        # Grow the atlas to the right, keeping what is already packed so handed out areas stay valid
+        atlas = pygame.Surface((origin[0] + block_size, block_size), pygame.SRCALPHA).convert_alpha()
+        atlas.fill((0, 0, 0, 0))
+        if old_atlas:
+            atlas.blit(old_atlas, (0, 0))
+        self._draw_atlas_block(atlas, grid_size, color, origin)
+
+        self.atlases[grid_size] = atlas
+        self.atlas_origins[(grid_size, color)] = origin
+        return origin
+
+    def _draw_atlas_block(self, atlas, grid_size, color, origin):
+        """Draw the colour's reference block into atlas with its top left at origin"""
+        atlas.fill((0, 0, 0, 0), (origin, (ATLAS_BLOCK_TILES * grid_size, ATLAS_BLOCK_TILES * grid_size)))
+        last = ATLAS_BLOCK_TILES - 1
+        for i in range(ATLAS_BLOCK_TILES):
+            for j in range(ATLAS_BLOCK_TILES):
+                if j == 0:
+                    variant = "top-left" if i == 0 else "top-right" if i == last else "top"
+                elif j == last:
+                    variant = "bottom-left" if i == 0 else "bottom-right" if i == last else "bottom"
+                else:
+                    variant = "left" if i == 0 else "right" if i == last else "center"
+                atlas.blit(self.get_tile(grid_size, color, variant), (origin[0] + i * grid_size, origin[1] + j * grid_size))
+
+    def get_block_tiles(self, grid_size, color, width, height):
+        """Atlas areas making up a block of the given size as (x, y, atlas area), positions relative to the block.
+
+        Corners and edges go around a centre fill, single row blocks only use the top tiles and single column
+        blocks only the left ones. Runs of edge and centre tiles are drawn from the atlas in one piece, so a
+        block of up to ATLAS_BLOCK_TILES square takes at most 9 blits. Lists are shared between blocks of the
+        same size and colour.
+        """
+        key = (grid_size, color, width // grid_size, height // grid_size)
+        tiles = self.block_tiles.get(key)
+        if tiles is not None:
+            return tiles
+
+        origin_x, origin_y = self._get_atlas_origin(grid_size, color)
+        columns = _get_tile_spans(key[2])
+        rows = _get_tile_spans(key[3])
+        tiles = [
+            (
+                column * grid_size, row * grid_size,
+                pygame.Rect(origin_x + source_column * grid_size, origin_y + source_row * grid_size, column_count * grid_size, row_count * grid_size)
+            )
+            for column, source_column, column_count in columns
+            for row, source_row, row_count in rows
+        ]
+
+        self.block_tiles[key] = tiles
+        return tiles
+
+    def get_tiles(self, grid_size, color):
+        return {variant: self.get_tile(grid_size, color, variant) for variant in TILE_VARIANTS}
+
+    def invalidate(self, grid_size=None, color=None):
+        """Drop cached tiles matching grid_size and color, None matches everything.
+        Calling with no arguments also forgets the base images so they are re-read from disk.
+
+        Matching colours are redrawn into the atlas where they already are, so the tile layouts blocks hold stay
+        valid. Chunks baked before keep the old pixels until they are rebaked.
+        """
+        if grid_size is None and color is None:
+            self.base_images.clear()
+
+        for key in list(self.tiles):
+            if (grid_size is None or key[0] == grid_size) and (color is None or key[1] == color):
+                del self.tiles[key]
+
+        for (atlas_grid_size, atlas_color), origin in self.atlas_origins.items():
+            if (grid_size is None or atlas_grid_size == grid_size) and (color is None or atlas_color == color):
+                self._draw_atlas_block(self.atlases[atlas_grid_size], atlas_grid_size, atlas_color, origin)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.file_reads = 0
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "file_reads": self.file_reads,
+            "entries": len(self.tiles),
+            "atlas_colors": len(self.atlas_origins),
+            "block_layouts": len(self.block_tiles)
+        }
+
+
+# Shared by every Block
+tile_cache = TileCache()
@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pygame
+from game_classes.block_class import Block
+from game_classes.block_group import BlockGroup
+from game_classes.chunk_layer import StaticChunkLayer
+from game_classes.entity_group import EntityGroup
+from game_classes.player_class import Player
+from game_classes.spatial_hash import SpatialHash
+from game_states.level_format import BINARY_EXTENSION, encode_level, open_level
+from game_states.level_saver import write_file_atomic
+from game_states.state_helpers import BLOCK_INDEX_CELLS
+
+# === World layout ===
+# worlds/<name>/world.json holds the settings and players, chunks/chunk_<x>_<y>.lvl the blocks of each chunk
+ENDLESS_WORLD_DIRECTORY = "worlds/endless"
+WORLD_FILE = "world.json"
+CHUNK_DIRECTORY = "chunks"
+WORLD_CHUNK_CELLS = 64  # Chunks are this many grid squares wide and high
+
+# === Terrain generation ===
+TERRAIN_KNOT_COLUMNS = 16  # Ground height is picked every this many columns and sloped in between
+TERRAIN_BASE_ROW = WORLD_CHUNK_CELLS // 2  # Ground sits mid chunk, blocks are split at chunk edges and show seams there
+TERRAIN_HEIGHT_ROWS = 3  # Ground rises and falls up to this many grid squares either side of the base row
+PLATFORMS_PER_CHUNK = 6  # Floating platforms tried in each chunk, those too close to the ground are skipped
+
+
+def get_chunk_path(directory, key):
+    return os.path.join(directory, CHUNK_DIRECTORY, f"chunk_{key[0]}_{key[1]}{BINARY_EXTENSION}")
+
+
+def get_ground_rows(seed, first_column, count):
+    """Grid row of the top of the ground in each of count columns, the same whichever chunk asks"""
+    knot_rows = {}
+
+    def get_knot_row(knot):
+        if knot not in knot_rows:
+            knot_rows[knot] = TERRAIN_BASE_ROW + random.Random(f"{seed}:{knot}").randint(-TERRAIN_HEIGHT_ROWS, TERRAIN_HEIGHT_ROWS)
+        return knot_rows[knot]
+
+    rows = []
+    for column in range(first_column, first_column + count):
+        knot, offset = divmod(column, TERRAIN_KNOT_COLUMNS)
+        left = get_knot_row(knot)
+        right = get_knot_row(knot + 1)
+        rows.append(round(left + (right - left) * offset / TERRAIN_KNOT_COLUMNS))
+    return rows
+
+
+def generate_chunk(seed, key, grid_size, chunk_cells=WORLD_CHUNK_CELLS):
+    """Block records (x, y, width, height, color) of a chunk of a generated world.
+
+    Rolling ground with floating platforms above it. Blocks never cross the chunk's edges, and a chunk only
+    depends on the seed and its key, so chunks can be made in any order and again after being evicted.
+    """
+    first_column = key[0] * chunk_cells
+    top_row = key[1] * chunk_cells
+    bottom_row = top_row + chunk_cells
+    ground_rows = get_ground_rows(seed, first_column, chunk_cells)
+    blocks = []
+
+    # Ground, one block per run of columns whose ground starts at the same row within the chunk
+    tops = [max(row, top_row) for row in ground_rows]
+    run_start = 0
+    for column in range(1, chunk_cells + 1):
+        if column < chunk_cells and tops[column] == tops[run_start]:
+            continue
+        if tops[run_start] < bottom_row:
+            blocks.append((
+                (first_column + run_start) * grid_size, tops[run_start] * grid_size,
+                (column - run_start) * grid_size, (bottom_row - tops[run_start]) * grid_size,
+                "green"
+            ))
+        run_start = column
+
+    rng = random.Random(f"{seed}:{key[0]}:{key[1]}")
+    for _ in range(PLATFORMS_PER_CHUNK):
+        width = rng.randint(2, 8)
+        column = rng.randrange(chunk_cells - width + 1)
+        row = top_row + rng.randrange(chunk_cells)
+        if row + 4 >= min(ground_rows[column:column + width]):
+            continue  # Leave room to walk under it
+        blocks.append(((first_column + column) * grid_size, row * grid_size, width * grid_size, grid_size, "blue"))
+    return blocks
+
+
+def load_world_metadata(directory):
+    """Settings and players of the world in directory, None if there is no world there"""
+    try:
+        with open(os.path.join(directory, WORLD_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def create_world(directory, grid_size, seed=None, generated=True, players=(), overhang=(0, 0)):
+    """Write the world.json of a new world and return its metadata
+
+    Args:
+        seed: Seed of the generated terrain, random if None
+        generated: Generate chunks that have no file, otherwise they are empty
+        players: Player records (x, y, color, gravity) to start with, none spawns players on the ground
+        overhang: How far (x, y) blocks reach past the right and bottom of the chunk they are stored in
+    """
+    metadata = {
+        "grid_size": grid_size,
+        "chunk_size": grid_size * WORLD_CHUNK_CELLS,
+        "seed": random.randrange(2 ** 31) if seed is None else seed,
+        "generated": generated,
+        "overhang": list(overhang),
+        "players": [{"x": x, "y": y, "color": color, "gravity": gravity} for x, y, color, gravity in players]
+    }
+    write_file_atomic(os.path.join(directory, WORLD_FILE), json.dumps(metadata, indent=4))
+    print(f"Created world in {directory}")
+    return metadata
+
+
+def level_to_world(level_path, directory, grid_size):
+    """Split a level file into a chunked world that isn't generated, returns the world's metadata"""
+    chunk_size = grid_size * WORLD_CHUNK_CELLS
+    chunks = {}
+    overhang_x = overhang_y = 0
+    with open_level(level_path) as level:
+        for x, y, width, height, color in level.iter_blocks():
+            key = (x // chunk_size, y // chunk_size)
+            chunks.setdefault(key, []).append((x, y, width, height, color))
+            overhang_x = max(overhang_x, x + width - (key[0] + 1) * chunk_size)
+            overhang_y = max(overhang_y, y + height - (key[1] + 1) * chunk_size)
+        players = list(level.iter_players())
+
+    for key, blocks in chunks.items():
+        write_file_atomic(get_chunk_path(directory, key), encode_level(blocks, []))
+    return create_world(directory, grid_size, 0, False, players, (overhang_x, overhang_y))
+
+
+def get_spawn_records(metadata, player_count):
+    """Player records of the world's own players, or player_count players side by side on the ground near x = 0"""
+    if metadata["players"]:
+        return [(player["x"], player["y"], player["color"], player["gravity"]) for player in metadata["players"]]
+
+    grid_size = metadata["grid_size"]
+    columns = [4 + i * 3 for i in range(player_count)]
+    if metadata["generated"]:
+        ground_rows = get_ground_rows(metadata["seed"], 0, columns[-1] + 2) if columns else []
+        # Player positions are their centres, stand them on the highest ground under them
+        rows = [min(ground_rows[column - 1:column + 2]) for column in columns]
+    else:
+        rows = [0] * player_count
+    return [(column * grid_size, row * grid_size - 32, "red", "down") for column, row in zip(columns, rows)]
+
+
+class ChunkedWorld:
+    def __init__(self, directory, metadata, load_margin=None, max_loaded_chunks=64):
+        """Blocks of a world too big to keep in memory, streamed in chunk by chunk around the camera and players.
+
+        Each block is stored in the chunk its top left corner is in. Chunks without a file are generated from the
+        world's seed in a generated world and empty otherwise. Chunks are read on one worker thread, update adds
+        the ones that are ready and evicts the least recently needed ones once more than max_loaded_chunks are
+        loaded. There are no threads on the web build, where chunks are read right away.
+
+        Args:
+            directory: World directory, see create_world
+            metadata: Contents of its world.json
+            load_margin: World pixels around the visible area loaded ahead of the camera, defaults to half a chunk
+            max_loaded_chunks: Chunks kept in memory, more are only kept while they are needed
+        """
+        self.directory = directory
+        self.grid_size = metadata["grid_size"]
+        self.chunk_size = metadata["chunk_size"]
+        self.chunk_cells = self.chunk_size // self.grid_size
+        self.seed = metadata["seed"]
+        self.generated = metadata["generated"]
+        self.overhang = metadata["overhang"]
+        self.load_margin = self.chunk_size // 2 if load_margin is None else load_margin
+        self.max_loaded_chunks = max_loaded_chunks
+
+        self.loaded = OrderedDict()  # Chunk key -> its blocks, least recently needed first
+        self.pending = {}  # Chunk key -> Future of its block records
+        self.executor = None
+        if sys.platform not in ("emscripten", "wasi"):
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world-loader")
+
+        self.visible_rect = pygame.Rect(0, 0, 0, 0)  # Scratch rect reused by update
+        self.stats = {"loaded": 0, "evicted": 0, "waited": 0}  # Chunks added, evicted and waited for, for profiling
+
+    def read_chunk(self, key):
+        """Block records of a chunk, from its file or generated. Runs on the worker thread."""
+        path = get_chunk_path(self.directory, key)
+        try:
+            with open_level(path) as level:
+                return list(level.iter_blocks())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Error reading chunk {path}: {e}")
+            return []
+        if self.generated:
+            return generate_chunk(self.seed, key, self.grid_size, self.chunk_cells)
+        return []
+
+    def request(self, key):
+        """Start reading a chunk unless it is loaded or already being read"""
+        if key in self.loaded or key in self.pending:
+            return
+        if self.executor:
+            self.pending[key] = self.executor.submit(self.read_chunk, key)
+            return
+        future = Future()
+        future.set_result(self.read_chunk(key))
+        self.pending[key] = future
+
+    def get_chunk_keys(self, rect, margin, keys):
+        """Add the keys of the chunks that can hold blocks within margin of rect to keys"""
+        chunk_size = self.chunk_size
+        # Blocks are stored by their top left corner, so blocks reaching into the area can start left of and above it
+        left = (rect[0] - margin - self.overhang[0]) // chunk_size
+        top = (rect[1] - margin - self.overhang[1]) // chunk_size
+        right = (rect[0] + rect[2] + margin) // chunk_size
+        bottom = (rect[1] + rect[3] + margin) // chunk_size
+        for chunk_x in range(left, right + 1):
+            for chunk_y in range(top, bottom + 1):
+                keys.add((chunk_x, chunk_y))
+
+    def request_around(self, app_state):
+        """Request the chunks app_state's camera and players need, returns (needed, required) key sets.
+
+        Required chunks are the ones around players, which have to be loaded before the next physics step.
+        """
+        required = set()
+        for player in app_state.game_sprites["players"].sprite_list():
+            self.get_chunk_keys(player.rect, self.grid_size * 4, required)
+        needed = set(required)
+        self.get_chunk_keys(app_state.camera.get_visible_rect(self.visible_rect), self.load_margin, needed)
+        for player in app_state.game_sprites["players"].sprite_list():
+            self.get_chunk_keys(player.rect, self.load_margin, needed)
+
+        for key in needed:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+            else:
+                self.request(key)
+
+        # Chunks not needed any more are dropped if the worker hasn't started on them
+        for key in [key for key in self.pending if key not in needed]:
+            if self.pending[key].cancel():
+                del self.pending[key]
+        return needed, required
+
+    def update(self, app_state):
+        """Stream chunks in and out around app_state's camera and players, call once per frame.
+
+        Chunks around a player that the worker hasn't finished are waited for, so players never fall through
+        ground that is still loading.
+        """
+        needed, required = self.request_around(app_state)
+        for key in required:
+            if key not in self.loaded and not self.pending[key].done():
+                self.pending[key].result()
+                self.stats["waited"] += 1
+
+        for key in [key for key, future in self.pending.items() if future.done()]:
+            future = self.pending.pop(key)
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Error loading chunk {key}: {e}")
+                records = []
+            self._add_chunk(app_state, key, records)
+
+        # Evict the least recently needed chunks, stopping at the first one still in use
+        while len(self.loaded) > self.max_loaded_chunks:
+            key = next(iter(self.loaded))
+            if key in needed:
+                break
+            self._remove_chunk(app_state, key)
+
+    def _add_chunk(self, app_state, key, records):
+        blocks = [Block(self.grid_size, pygame.Rect(x, y, width, height), color) for x, y, width, height, color in records]
+        app_state.game_sprites["blocks"].add(*blocks)
+        for block in blocks:
+            app_state.block_index.insert(block)
+            app_state.chunk_layer.add_block(block)
+        self.loaded[key] = blocks
+        self.stats["loaded"] += 1
+        self._mark_dirty(app_state, key)
+
+    def _remove_chunk(self, app_state, key):
+        blocks = self.loaded.pop(key)
+        app_state.game_sprites["blocks"].remove(*blocks)
+        for block in blocks:
+            app_state.block_index.remove(block)
+            app_state.chunk_layer.remove_block(block)
+        self.stats["evicted"] += 1
+        self._mark_dirty(app_state, key)
+
+    def _mark_dirty(self, app_state, key):
+        chunk_rect = (
+            key[0] * self.chunk_size, key[1] * self.chunk_size,
+            self.chunk_size + self.overhang[0], self.chunk_size + self.overhang[1]
+        )
+        app_state.dirty.mark_world(chunk_rect, app_state.camera)
+
+    def get_stats(self):
+        return {
+            "loaded_chunks": len(self.loaded),
+            "pending_chunks": len(self.pending),
+            **self.stats
+        }
+
+    def close(self):
+        """Stop reading chunks, call when the world is left"""
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _start_world(app_state, directory, player_count, max_loaded_chunks):
+    """Replace app_state's level with the world's players and no blocks yet, returns the ChunkedWorld"""
+    metadata = load_world_metadata(directory)
+    if metadata is None:
+        metadata = create_world(directory, app_state.context["grid_size"])
+    grid_size = metadata["grid_size"]
+
+    app_state.game_sprites = {"blocks": BlockGroup(), "players": EntityGroup()}
+    app_state.block_index = SpatialHash(grid_size * BLOCK_INDEX_CELLS)
+    app_state.chunk_layer = StaticChunkLayer()
+    for x, y, color, gravity in get_spawn_records(metadata, player_count):
+        player = Player((x, y), color, gravity)
+        player.add(app_state.game_sprites["players"])
+    return ChunkedWorld(directory, metadata, max_loaded_chunks=max_loaded_chunks)
+
+
+def load_world(app_state, directory, player_count=1, max_loaded_chunks=64):
+    """Replace app_state's level with a streamed world, creating a generated world if directory has none.
+
+    Only the chunks around the players and camera are loaded before this returns, however big the world is.
+
+    Returns:
+        The ChunkedWorld, its update must be called every frame
+    """
+    world = _start_world(app_state, directory, player_count, max_loaded_chunks)
+    world.request_around(app_state)
+    for future in list(world.pending.values()):
+        future.result()  # The first frame shows everything around the players
+    world.update(app_state)
+    print(f"World loaded from {directory}")
+    return world
+
+
+async def load_world_async(app_state, directory, player_count=1, progress=None, max_loaded_chunks=64):
+    """Like load_world but lets the game loop keep running while the first chunks are read.
+
+    Args:
+        progress: Callable taking the fraction of the first chunks read so far
+    """
+    world = _start_world(app_state, directory, player_count, max_loaded_chunks)
+    world.request_around(app_state)
+    futures = list(world.pending.values())
+    for i, future in enumerate(futures):
+        await asyncio.wrap_future(future)
+        if progress:
+            progress((i + 1) / len(futures))
+    world.update(app_state)
+    print(f"World loaded from {directory}")
+    return world
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a level into a chunked world that streams in as it is played")
+    parser.add_argument("level", help="Level file, JSON or binary")
+    parser.add_argument("directory", help="World directory to write, e.g. worlds/my_world")
+    parser.add_argument("--grid-size", type=int, default=16)
+    args = parser.parse_args()
+
+    metadata = level_to_world(args.level, args.directory, args.grid_size)
+    print(f"{args.level} -> {args.directory} ({len(metadata['players'])} players)")
+
+
+if __name__ == "__main__":
+    main()
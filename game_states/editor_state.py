@@ -1,9 +1,13 @@
 import math
-import json
 import pygame
 from game_classes.camera_class import Camera
-from game_states.state_helpers import BaseState, StateTransition, load_level
+from game_classes.block_group import BlockGroup
+from game_classes.entity_group import EntityGroup
+from game_states.state_helpers import BaseState, DirtyRegion, StateTransition, load_level, load_level_async, render_sprites, BLOCK_INDEX_CELLS
+from game_classes.spatial_hash import SpatialHash
+from game_classes.chunk_layer import StaticChunkLayer
 from game_classes.block_class import Block
+from game_states.level_saver import LevelSaver, allocate_save_slot, snapshot_level
 
 
 class EditorState(BaseState):
@@ -25,9 +29,15 @@ class EditorState(BaseState):
         self.level_info = None
 
         self.game_sprites = {
-            "blocks": pygame.sprite.Group(),
-            "players": pygame.sprite.Group()
+            "blocks": BlockGroup(),
+            "players": EntityGroup()
         }
+        self.block_index = SpatialHash(self.context["grid_size"] * BLOCK_INDEX_CELLS)
+        self.chunk_layer = StaticChunkLayer()  # Blocks are drawn from pre-rendered chunks
+        self.render_stats = {"drawn": 0, "culled": 0}  # Sprites drawn and culled last frame
+        self.dirty = DirtyRegion()  # Changed screen areas for dirty-rect rendering
+        self.level_saver = LevelSaver(self.context["level_index"])
+        self.pending_merge = None  # (save future, block_index.version when it was snapshotted)
 
     def _handle_block_editing(self, event):
         if event.type == pygame.KEYDOWN:
@@ -41,6 +51,9 @@ class EditorState(BaseState):
                 block_under_mouse = [block for block in self.game_sprites["blocks"] if block.rect.collidepoint(self.camera.screen_pos_to_game(event.pos))]
                 if block_under_mouse:
                     self.game_sprites["blocks"].remove(block_under_mouse[0])
+                    self.block_index.remove(block_under_mouse[0])
+                    self.chunk_layer.remove_block(block_under_mouse[0])
+                    self.dirty.mark_world(block_under_mouse[0].rect, self.camera)
 
             if event.button == 1:  # Left mouse button pressed
                 # Convert screen position to game coordinates
@@ -53,7 +66,11 @@ class EditorState(BaseState):
                 )
 
                 # Create a new 10x10 block at the snapped mouse-down position
-                Block(self.grid_size, pygame.Rect(self.mouse_down_pos, (self.grid_size, self.grid_size))).add(self.game_sprites["blocks"])
+                block = Block(self.grid_size, pygame.Rect(self.mouse_down_pos, (self.grid_size, self.grid_size)))
+                self.game_sprites["blocks"].add(block)
+                self.block_index.insert(block)
+                self.chunk_layer.add_block(block)
+                self.dirty.mark_world(block.rect, self.camera)
 
         if event.type == pygame.MOUSEMOTION:
             if event.buttons[0]:  # The left mouse button is held down
@@ -81,63 +98,90 @@ class EditorState(BaseState):
                 new_rect.normalize()  # Adjusts rect to ensure positive width and height
 
                 # Update the size of the most recently created block
-                self.game_sprites["blocks"].sprites()[-1].rect = new_rect
-                self.game_sprites["blocks"].sprites()[-1].update_image()  # Updates size of image to match new rect
+                block = self.game_sprites["blocks"].sprite_list()[-1]
+                if new_rect == block.rect:
+                    return  # Mouse moved within the same grid square, nothing to redo
+                self.dirty.mark_world(block.rect, self.camera)
+                self.dirty.mark_world(new_rect, self.camera)
+                old_rect = block.rect
+                block.rect = new_rect
+                block.update_image()  # Updates size of image to match new rect
+                self.block_index.update(block)
+                self.chunk_layer.update_block(block, old_rect)  # Only chunks along the moving edges are rebaked
 
         if event.type == pygame.MOUSEBUTTONUP:
             if event.button == 1:  # The left mouse button released
                 # Clear the mouse-down position to end the drag operation
                 self.mouse_down_pos = None
 
+    def apply_merge_changes(self, replaced, added):
+        """Swap merged blocks for the rects they were merged into. Returns the number of blocks removed.
+
+        Args:
+            replaced: Indices into the block list of the blocks merged away, see get_merge_changes
+            added: Merged records, the replaced blocks are reused for these and the rest are removed
+        """
+        blocks = self.game_sprites["blocks"].sprite_list()
+        changed = [blocks[i] for i in replaced]
+
+        # Only the chunks around merged blocks are rebaked
+        for block, (x, y, width, height, color) in zip(changed, added):
+            if block.color != color:
+                block.set_color(color)
+            block.rect = pygame.Rect(x, y, width, height)
+            block.update_image()
+            self.block_index.update(block)
+            self.chunk_layer.update_block(block)
+        removed = changed[len(added):]
+        self.game_sprites["blocks"].remove(*removed)
+        for block in removed:
+            self.block_index.remove(block)
+            self.chunk_layer.remove_block(block)
+
+        self.dirty.mark_all()
+        return len(removed)
+
     def save_level(self):
+        """Save the level in the background, returns a Future resolving to the path written and the merge changes
 
-        # read from saved_count.txt
-        try:
-            with open("levels/saved_count.txt", "r") as f:
-                level_count = int(f.read())
-        except FileNotFoundError:
-            level_count = 0
-            # create saved_count.txt
-            with open("levels/saved_count.txt", "w") as f:
-                f.write(str(int(level_count + 1)))
-        # Add one to the saved_count.txt
-        with open("levels/saved_count.txt", "w") as f:
-            f.write(str(int(level_count + 1)))
-
-        # Save block data as JSON
-        location = f"levels/saved/saved_level_{level_count}.json"
+        Touching blocks are merged on the saver's worker when merge_blocks_on_save is set, update swaps in the merged
+        blocks once the save finishes unless the level was edited in the meantime.
+        """
+        # Only the snapshot is taken on this thread, merging, encoding and writing happen on the saver's worker
+        snapshot = snapshot_level(self.game_sprites)
         if self.level_info:
             location = f"levels/{self.level_info['player_count']}_players/world_{self.level_info['world']}/level_{self.level_info['level']}.json"
-
-        with open(location, "w") as f:
-            data = {
-                "blocks": [
-                    {
-                        "x": block.rect.x,
-                        "y": block.rect.y,
-                        "width": block.rect.width,
-                        "height": block.rect.height,
-                        "color": "blue"
-                    }
-                    for block in self.game_sprites["blocks"]
-                ],
-                "players": [
-                    {
-                        "x": player.rect.x,
-                        "y": player.rect.y,
-                        "color": player.color,
-                        "gravity": player.gravity_direction
-                    }
-                    for player in self.game_sprites["players"]
-                ],
-            }
-            json.dump(data, f, indent=4)
-
-        print(f"Level saved to " + location)
+        else:
+            location = allocate_save_slot()
+        merge_grid_size = self.grid_size if self.context["merge_blocks_on_save"] else None
+        future = self.level_saver.save(location, snapshot, merge_grid_size)
+        if merge_grid_size:
+            self.pending_merge = (future, self.block_index.version)
+        return future
+
+    def _apply_finished_merge(self):
+        future, block_version = self.pending_merge
+        if not future.done():
+            return
+        self.pending_merge = None
+        if future.exception() or self.block_index.version != block_version:
+            return  # Not saved, or blocks were added, removed or moved since the snapshot so its indices are stale
+        self.apply_merge_changes(*future.result()[1])
 
     def load_level(self, player_count, world, level):
+        self.pending_merge = None
         self.level_info = {"player_count": player_count, "world": world, "level": level}
-        load_level(self, self.context["grid_size"], player_count, world, level)
+        load_level(self, self.context["grid_size"], player_count, world, level, self.context["merge_blocks_on_load"], level_index=self.context["level_index"])
+        self.dirty.mark_all()
+
+    async def load_level_async(self, player_count, world, level, progress=None):
+        self.pending_merge = None
+        self.level_info = {"player_count": player_count, "world": world, "level": level}
+        await load_level_async(
+            self, self.context["grid_size"], player_count, world, level, progress, self.context["merge_blocks_on_load"],
+            level_index=self.context["level_index"]
+        )
+        self.dirty.mark_all()
 
     def handle_events(self, events):
         for event in events:
@@ -153,9 +197,13 @@ class EditorState(BaseState):
 
     def update(self, delta_time):
         self.camera.handle_frame_input()
+        if self.pending_merge:
+            self._apply_finished_merge()
 
     def render(self, screen):
         screen.fill("light pink")
-        for object_group in self.game_sprites.values():
-            for sprite in object_group.sprites():
-                sprite.draw(screen, self.camera)
+        self.chunk_layer.draw(screen, self.camera)
+        self.render_stats = render_sprites(screen, self.camera, {"players": self.game_sprites["players"]})
+
+    def get_dirty_rects(self):
+        return self.dirty.take(self.camera)
@@ -1,6 +1,14 @@
+import time
 import pygame
-from game_states.state_helpers import BaseState, StateTransition, load_level
+from game_states.state_helpers import BaseState, DirtyRegion, StateTransition, load_level, load_level_async, render_sprites, BLOCK_INDEX_CELLS
+from game_states.chunked_world import load_world, load_world_async
+from game_classes.spatial_hash import SpatialHash
+from game_classes.chunk_layer import StaticChunkLayer
 from game_classes.camera_class import Camera
+from game_classes.block_group import BlockGroup
+from game_classes.entity_group import EntityGroup
+from game_classes.input_recorder import InputRecorder
+from game_classes.player_broadphase import SweepAndPrune
 
 
 class GameState(BaseState):
@@ -9,9 +17,34 @@ class GameState(BaseState):
         self.camera = Camera(self.context["screen_size"])
 
         self.game_sprites = {
-            "blocks": pygame.sprite.Group(),
-            "players": pygame.sprite.Group()
+            "blocks": BlockGroup(),
+            "players": EntityGroup()
         }
+        self.block_index = SpatialHash(self.context["grid_size"] * BLOCK_INDEX_CELLS)
+        self.chunk_layer = StaticChunkLayer()  # Blocks are drawn from pre-rendered chunks
+        self.render_stats = {"drawn": 0, "culled": 0}  # Sprites drawn and culled last frame
+        self.level_info = None
+        self.world = None  # ChunkedWorld streaming blocks in around the camera, None when a whole level is loaded
+        self.dirty = DirtyRegion()  # Changed screen areas for dirty-rect rendering
+        self.player_screen_rects = {}  # Player -> screen rect it was last drawn to
+        self.input_recorder = None  # Records player inputs while set, F5 starts and stops it
+
+        # === Fixed timestep ===
+        self.time_accumulator = 0.0  # Simulation time not yet stepped
+        self.interpolation = 1.0  # Fraction of a step between the previous and current player rects
+        self.tick_count = 0
+        self.collision_candidates = 0  # Rects tested against players in the last step, for profiling
+        self.player_broadphase = SweepAndPrune()  # Finds the players near each player, rebuilt every step
+
+        # === Physics backend ===
+        self.batch_physics = None  # Simulates all players together when the numpy backend is used
+        if self.context["physics_backend"] == "numpy":
+            # Imported here so NumPy is only loaded when it is used, it is slow to import at startup
+            from game_classes.batch_physics import BatchPhysics, NUMPY_AVAILABLE
+            if NUMPY_AVAILABLE:
+                self.batch_physics = BatchPhysics()
+            else:
+                print("NumPy is not installed, falling back to the python physics backend")
 
     def handle_events(self, events):
         for event in events:
@@ -20,53 +53,166 @@ class GameState(BaseState):
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.next_transitions = [StateTransition("push", "menu", {"submenu": "game_pause"})]
+                if event.key == pygame.K_F5:
+                    if self.input_recorder:
+                        self.stop_recording()
+                    else:
+                        self.start_recording()
+
+        # On input, assign unassigned player to input handler and vice versa. Once a frame, input is read from
+        # the frame's snapshot so it can't change between events.
+        # filter all input handlers that do not have a player
+        for input_handler in self.context["input_handlers"]:
+            if input_handler.player:
+                continue
+
+            # filter all input handlers that are not inputting
+            inputs = input_handler.get_input()
+            if not inputs or not any(inputs.values()):
+                continue
+
+            for player in self.game_sprites["players"].sprite_list():
+                if not player.input_handler:
+                    input_handler.player = player
+                    player.input_handler = input_handler
+                    if not isinstance(input_handler.joystick, str):
+                        print(f"Assigned {self.game_sprites["players"].sprites().index(player)} to {input_handler.joystick.get_name()}")
+                    else:
+                        print(f"Assigned {self.game_sprites["players"].sprites().index(player)} to keyboard_1 or keyboard_2")
+                    break
+
+    def start_recording(self):
+        players = self.game_sprites["players"].sprite_list()
+        self.input_recorder = InputRecorder(players, self.context["physics_tick_rate"], self.level_info)
+        print("Recording inputs, press F5 again to stop")
 
-            # On input, assign unassigned player to input handler and vice versa
-            # filter all input handlers that do not have a player
-            for input_handler in self.context["input_handlers"]:
-                if input_handler.player:
-                    continue
-
-                # filter all input handlers that are not inputting
-                if not any(input_handler.get_input().values()):
-                    continue
-
-                for player in self.game_sprites["players"].sprites():
-                    if not player.input_handler:
-                        input_handler.player = player
-                        player.input_handler = input_handler
-                        if not isinstance(input_handler.joystick, str):
-                            print(f"Assigned {self.game_sprites["players"].sprites().index(player)} to {input_handler.joystick.get_name()}")
-                        else:
-                            print(f"Assigned {self.game_sprites["players"].sprites().index(player)} to keyboard_1 or keyboard_2")
-                        break
+    def stop_recording(self, path=None):
+        """Save the inputs recorded so far, by default to recordings/"""
+        if not self.input_recorder:
+            return None
+        path = path or time.strftime("recordings/inputs_%Y%m%d_%H%M%S.rec")
+        self.input_recorder.save(path, self.game_sprites["players"].sprites())
+        self.input_recorder = None
+        return path
 
     def load_level(self, player_count, world, level):
-        load_level(self, self.context["grid_size"], player_count, world, level)
+        self.stop_recording()  # The recording only makes sense for the level it started in
+        self.close_world()
+        self.level_info = {"player_count": player_count, "world": world, "level": level}
+        load_level(self, self.context["grid_size"], player_count, world, level, self.context["merge_blocks_on_load"], level_index=self.context["level_index"])
+        self.dirty.mark_all()
+        self.player_screen_rects = {}
+
+    async def load_level_async(self, player_count, world, level, progress=None):
+        self.stop_recording()
+        self.close_world()
+        self.level_info = {"player_count": player_count, "world": world, "level": level}
+        await load_level_async(
+            self, self.context["grid_size"], player_count, world, level, progress, self.context["merge_blocks_on_load"],
+            level_index=self.context["level_index"]
+        )
+        self.dirty.mark_all()
+        self.player_screen_rects = {}
+
+    def load_world(self, directory, player_count):
+        """Play a chunked world, see chunked_world. A generated world is created if directory has none."""
+        self.stop_recording()
+        self.close_world()
+        self.level_info = None  # Recordings of worlds can't be replayed by level
+        self.world = load_world(self, directory, player_count)
+        self.center_camera()
+        self.dirty.mark_all()
+        self.player_screen_rects = {}
+
+    async def load_world_async(self, directory, player_count, progress=None):
+        self.stop_recording()
+        self.close_world()
+        self.level_info = None
+        self.world = await load_world_async(self, directory, player_count, progress)
+        self.center_camera()
+        self.dirty.mark_all()
+        self.player_screen_rects = {}
+
+    def close_world(self):
+        if self.world:
+            self.world.close()
+            self.world = None
 
     def save_level(self):
         pass
 
     def update(self, delta_time):
-        # Calculate next positions
-        for player in self.game_sprites["players"].sprites():
-            player.calc_next_pos(delta_time, self.game_sprites["blocks"].sprites() + self.game_sprites["players"].sprites())
+        # Run the simulation in fixed steps, leftover time carries over to the next frame
+        step = 1 / self.context["physics_tick_rate"]
+        self.time_accumulator += delta_time
+        steps = 0
+        while self.time_accumulator >= step:
+            if steps >= self.context["max_physics_steps"]:
+                # Too far behind (e.g. after a hitch), drop the backlog instead of trying to catch up
+                self.time_accumulator %= step
+                break
+            self.fixed_update(step)
+            self.time_accumulator -= step
+            steps += 1
 
-        # Move players
-        for player in self.game_sprites["players"].sprites():
-            player.apply_next_pos()
-            if player.input_handler:
-                player.apply_input(delta_time)
+        # Players are drawn part way between their previous and current rects
+        self.interpolation = self.time_accumulator / step
+        players = self.game_sprites["players"].sprite_list()
+        for player in players:
+            player.interpolation = self.interpolation
+
+        self.center_camera()
+        if self.world:
+            self.world.update(self)  # Stream chunks in and out around where the camera and players now are
 
-        if len(self.game_sprites["players"].sprites()) > 0:
+    def center_camera(self):
+        """Move the camera to the centre of all players"""
+        players = self.game_sprites["players"].sprite_list()
+        if len(players) > 0:
             center_of_all_players = pygame.Vector2(0, 0)
-            for player in self.game_sprites["players"].sprites():
-                center_of_all_players += player.rect.center
-            center_of_all_players /= len(self.game_sprites["players"].sprites())
+            for player in players:
+                center_of_all_players += player.get_bounds().center
+            center_of_all_players /= len(players)
             self.camera.move_center_to(center_of_all_players)
 
+    def fixed_update(self, delta_time):
+        self.calc_next_positions(delta_time)
+        self.move_players(delta_time)
+        self.tick_count += 1
+
+    def calc_next_positions(self, delta_time):
+        players = self.game_sprites["players"].sprite_list()
+        if self.batch_physics:
+            self.batch_physics.step(delta_time, self.block_index, players)
+            self.collision_candidates = self.batch_physics.candidate_count
+            return
+        self.player_broadphase.rebuild(players)
+        for player in players:
+            player.calc_next_pos(delta_time, self.block_index, self.player_broadphase)
+        self.collision_candidates = sum(player.collision_candidates for player in players)
+
+    def move_players(self, delta_time):
+        players = self.game_sprites["players"].sprite_list()
+        for player in players:
+            player.apply_next_pos()
+            if player.input_handler:
+                player.apply_input(delta_time)
+        if self.input_recorder:
+            self.input_recorder.record_tick(players)
+
     def render(self, screen):
         screen.fill("light blue")
-        for object_group in self.game_sprites.values():
-            for sprite in object_group.sprites():
-                sprite.draw(screen, self.camera)
+        self.chunk_layer.draw(screen, self.camera)
+        self.render_stats = render_sprites(screen, self.camera, {"players": self.game_sprites["players"]})
+
+    def get_dirty_rects(self):
+        # Players moving without the camera moving only needs their old and new areas redrawn
+        for player in self.game_sprites["players"]:
+            screen_rect = player.get_display_rect(self.camera)
+            last_screen_rect = self.player_screen_rects.get(player)
+            if screen_rect != last_screen_rect:
+                self.dirty.mark(screen_rect.inflate(2, 2))
+                if last_screen_rect:
+                    self.dirty.mark(last_screen_rect.inflate(2, 2))
+                self.player_screen_rects[player] = screen_rect
+        return self.dirty.take(self.camera)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+# === Binary level format ===
+# Header, colour palette, then fixed-width block and player records, all little-endian.
+# Fixed-width records let the loader unpack straight out of a memory-mapped file without copying it.
+LEVEL_MAGIC = b"GLVL"
+LEVEL_VERSION = 1
+HEADER = struct.Struct("<4sHHII")  # magic, version, palette size, block count, player count
+PALETTE_ENTRY = struct.Struct("<B")  # length of the utf-8 colour name that follows
+BLOCK_RECORD = struct.Struct("<iiiiH")  # x, y, width, height, palette index
+PLAYER_RECORD = struct.Struct("<iiHB")  # x, y, palette index, gravity index
+GRAVITY_DIRECTIONS = [None, "down", "up", "left", "right"]
+
+JSON_EXTENSION = ".json"
+BINARY_EXTENSION = ".lvl"
+
+
+class JsonLevel:
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    @property
+    def block_count(self):
+        return len(self.data["blocks"])
+
+    @property
+    def player_count(self):
+        return len(self.data["players"])
+
+    def iter_blocks(self):
+        for block_data in self.data["blocks"]:
+            yield block_data["x"], block_data["y"], block_data["width"], block_data["height"], block_data["color"]
+
+    def iter_players(self):
+        for player_data in self.data["players"]:
+            yield player_data["x"], player_data["y"], player_data["color"], player_data["gravity"]
+
+
+class BinaryLevel:
+    def __init__(self, buffer, file=None, mapping=None):
+        """Level read from the binary format, records are unpacked lazily from buffer.
+
+        Args:
+            buffer: Bytes or memory-mapped contents of the file
+            file: Open file backing the mapping, closed with the level
+            mapping: mmap of the file, closed with the level
+        """
+        self.file = file
+        self.mapping = mapping
+        self.buffer = memoryview(buffer)
+
+        magic, version, palette_size, self.block_count, self.player_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != LEVEL_MAGIC:
+            raise ValueError("Not a binary level file")
+        if version != LEVEL_VERSION:
+            raise ValueError(f"Unsupported binary level version {version}")
+
+        offset = HEADER.size
+        self.palette = []
+        for _ in range(palette_size):
+            (length,) = PALETTE_ENTRY.unpack_from(self.buffer, offset)
+            offset += PALETTE_ENTRY.size
+            self.palette.append(bytes(self.buffer[offset:offset + length]).decode("utf-8"))
+            offset += length
+
+        self.blocks_offset = offset
+        self.players_offset = offset + self.block_count * BLOCK_RECORD.size
+        if self.players_offset + self.player_count * PLAYER_RECORD.size > len(self.buffer):
+            raise ValueError("Binary level file is truncated")
+
+    @classmethod
+    def load(cls, path):
+        file = open(path, "rb")
+        try:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # mmap is unavailable on some platforms (e.g. the web build), read the file instead
+            buffer = file.read()
+            file.close()
+            return cls(buffer)
+        return cls(mapping, file, mapping)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.buffer.release()
+        if self.mapping:
+            self.mapping.close()
+        if self.file:
+            self.file.close()
+
+    def iter_blocks(self):
+        palette = self.palette
+        records = self.buffer[self.blocks_offset:self.players_offset]
+        for x, y, width, height, color in BLOCK_RECORD.iter_unpack(records):
+            yield x, y, width, height, palette[color]
+        records.release()
+
+    def iter_players(self):
+        palette = self.palette
+        records = self.buffer[self.players_offset:self.players_offset + self.player_count * PLAYER_RECORD.size]
+        for x, y, color, gravity in PLAYER_RECORD.iter_unpack(records):
+            yield x, y, palette[color], GRAVITY_DIRECTIONS[gravity]
+        records.release()
+
+
+def open_level(path):
+    """Open a level file, the format is picked from the file contents"""
+    with open(path, "rb") as f:
+        is_binary = f.read(len(LEVEL_MAGIC)) == LEVEL_MAGIC
+    if is_binary:
+        return BinaryLevel.load(path)
+    return JsonLevel.load(path)
+
+
+def encode_level(blocks, players):
+    """Pack block records (x, y, width, height, color) and player records (x, y, color, gravity) into the binary format"""
+    blocks = list(blocks)
+    players = list(players)
+
+    palette = []
+    palette_indices = {}
+    for color in [block[4] for block in blocks] + [player[2] for player in players]:
+        if color not in palette_indices:
+            palette_indices[color] = len(palette)
+            palette.append(color)
+
+    parts = [HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, len(palette), len(blocks), len(players))]
+    for color in palette:
+        encoded = color.encode("utf-8")
+        parts.append(PALETTE_ENTRY.pack(len(encoded)))
+        parts.append(encoded)
+    for x, y, width, height, color in blocks:
+        parts.append(BLOCK_RECORD.pack(x, y, width, height, palette_indices[color]))
+    for x, y, color, gravity in players:
+        parts.append(PLAYER_RECORD.pack(round(x), round(y), palette_indices[color], GRAVITY_DIRECTIONS.index(gravity)))
+    return b"".join(parts)
+
+
+def level_to_data(level):
+    """Level in the JSON layout"""
+    return {
+        "blocks": [
+            {"x": x, "y": y, "width": width, "height": height, "color": color}
+            for x, y, width, height, color in level.iter_blocks()
+        ],
+        "players": [
+            {"x": x, "y": y, "color": color, "gravity": gravity}
+            for x, y, color, gravity in level.iter_players()
+        ],
+    }
+
+
+def json_to_binary(json_path, binary_path=None):
+    binary_path = binary_path or os.path.splitext(json_path)[0] + BINARY_EXTENSION
+    level = JsonLevel.load(json_path)
+    with open(binary_path, "wb") as f:
+        f.write(encode_level(level.iter_blocks(), level.iter_players()))
+    return binary_path
+
+
+def binary_to_json(binary_path, json_path=None):
+    json_path = json_path or os.path.splitext(binary_path)[0] + JSON_EXTENSION
+    with BinaryLevel.load(binary_path) as level:
+        data = level_to_data(level)
+    with open(json_path, "w") as f:
+        json.dump(data, f, indent=4)
+    return json_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert levels between the JSON and binary formats")
+    parser.add_argument("direction", choices=["to-binary", "to-json"])
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if args.direction == "to-binary":
+            print(f"{path} -> {json_to_binary(path)}")
+        else:
+            print(f"{path} -> {binary_to_json(path)}")
+
+
+if __name__ == "__main__":
+    main()
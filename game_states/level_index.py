@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from game_states.level_format import BINARY_EXTENSION, JSON_EXTENSION, LEVEL_MAGIC, BinaryLevel, JsonLevel
+
+# levels/<player_count>_players/world_<world>/level_<level>.json or .lvl, relative to the index root
+LEVEL_PATH_PATTERN = re.compile(r"^(\d+)_players/world_(\d+)/level_(\d+)(\.json|\.lvl)$")
+
+
+def read_level_metadata(path):
+    """Counts, bounds and hash of a level file, read in one go
+
+    Returns:
+        Dict with path, block_count, player_count, bounds (left, top, right, bottom, None for an empty level),
+        mtime, size and hash
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+
+    if data[:len(LEVEL_MAGIC)] == LEVEL_MAGIC:
+        level = BinaryLevel(data)
+    else:
+        level = JsonLevel(json.loads(data))
+
+    # Bounds cover every block and player position
+    left = top = right = bottom = None
+    for x, y, width, height, _ in level.iter_blocks():
+        left = x if left is None else min(left, x)
+        top = y if top is None else min(top, y)
+        right = x + width if right is None else max(right, x + width)
+        bottom = y + height if bottom is None else max(bottom, y + height)
+    for x, y, _, _ in level.iter_players():
+        left = x if left is None else min(left, x)
+        top = y if top is None else min(top, y)
+        right = x if right is None else max(right, x)
+        bottom = y if bottom is None else max(bottom, y)
+    block_count = level.block_count
+    player_count = level.player_count
+    if isinstance(level, BinaryLevel):
+        level.close()
+
+    return {
+        "path": path,
+        "block_count": block_count,
+        "player_count": player_count,
+        "bounds": None if left is None else (left, top, right, bottom),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hashlib.sha1(data).hexdigest()
+    }
+
+
+class LevelIndex:
+    def __init__(self, root="levels"):
+        """Metadata of every level file under root, so menus and loads don't have to probe the filesystem.
+
+        The directory is scanned once on a background thread by start, is_ready says when that has finished.
+        Files are only re-read when their mtime or size changed, and update re-indexes a single file after a save.
+        """
+        self.root = root
+        self.levels = {}  # (player_count, world, level) -> {extension: metadata}, see read_level_metadata
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Scan root on a worker thread, or right away on the web build where there are no threads"""
+        if sys.platform in ("emscripten", "wasi"):
+            self.scan()
+            return
+        self.thread = threading.Thread(target=self.scan, name="level-index", daemon=True)
+        self.thread.start()
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the first scan has finished, returns whether it has"""
+        return self.ready.wait(timeout)
+
+    def scan(self):
+        """Index every level file under root, dropping levels whose files are gone"""
+        # Only levels indexed before the scan can be gone, ones saved and updated while it runs must be kept
+        with self.lock:
+            indexed = {(key, extension): metadata for key, files in self.levels.items()
+                       for extension, metadata in files.items()}
+        found = set()
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if self.update(path):
+                    found.add(path)
+
+        with self.lock:
+            for key, files in list(self.levels.items()):
+                for extension, metadata in list(files.items()):
+                    if indexed.get((key, extension)) is metadata and metadata["path"] not in found:
+                        del files[extension]
+                if not files:
+                    del self.levels[key]
+        self.ready.set()
+        print(f"Indexed {len(self.levels)} levels in {self.root}")
+
+    def _parse_path(self, path):
+        """(player_count, world, level) and extension of a level file path, None for other files"""
+        match = LEVEL_PATH_PATTERN.match(os.path.relpath(path, self.root).replace(os.sep, "/"))
+        if not match:
+            return None
+        return (int(match[1]), int(match[2]), int(match[3])), match[4]
+
+    def update(self, path):
+        """Re-index one file, call after saving or creating a level. Returns its metadata, None if it isn't a level."""
+        parsed = self._parse_path(path)
+        if parsed is None:
+            return None
+        key, extension = parsed
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove(path)
+            return None
+
+        with self.lock:
+            metadata = self.levels.get(key, {}).get(extension)
+        if metadata and metadata["mtime"] == stat.st_mtime_ns and metadata["size"] == stat.st_size:
+            return metadata  # Unchanged since it was read
+
+        try:
+            metadata = read_level_metadata(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not index level {path}: {e}")
+            self.remove(path)
+            return None
+
+        with self.lock:
+            self.levels.setdefault(key, {})[extension] = metadata
+        return metadata
+
+    def remove(self, path):
+        parsed = self._parse_path(path)
+        if parsed is None:
+            return
+        key, extension = parsed
+        with self.lock:
+            files = self.levels.get(key, {})
+            files.pop(extension, None)
+            if not files:
+                self.levels.pop(key, None)
+
+    def get(self, player_count, world, level):
+        """Metadata of the file the level loads from, None if it has no file.
+
+        Like find_level_file, the binary file is used unless the JSON one was saved after it.
+        """
+        with self.lock:
+            files = self.levels.get((player_count, world, level))
+            if not files:
+                return None
+            binary = files.get(BINARY_EXTENSION)
+            json_file = files.get(JSON_EXTENSION)
+        if binary and json_file:
+            return json_file if json_file["mtime"] > binary["mtime"] else binary
+        return binary or json_file
+
+    def get_player_counts(self):
+        with self.lock:
+            return sorted({key[0] for key in self.levels})
+
+    def get_worlds(self, player_count):
+        with self.lock:
+            return sorted({key[1] for key in self.levels if key[0] == player_count})
+
+    def get_levels(self, player_count, world):
+        with self.lock:
+            return sorted(key[2] for key in self.levels if key[0] == player_count and key[1] == world)
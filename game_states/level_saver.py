@@ -0,0 +1,145 @@
+import json
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from game_classes.block_merge import get_merge_changes
+
+SAVED_LEVELS_DIRECTORY = "levels/saved"
+SAVED_LEVEL_PATTERN = re.compile(r"^saved_level_(\d+)\.json$")
+
+
+def snapshot_level(game_sprites):
+    """Block records (x, y, width, height, color) and player records (x, y, color, gravity) copied out of the sprites,
+    so the level can be written while they keep changing. Plain tuples keep the copy quick."""
+    blocks = [(*block.rect, block.color) for block in game_sprites["blocks"]]
+    players = [(player.rect.x, player.rect.y, player.color, player.gravity_direction) for player in game_sprites["players"]]
+    return blocks, players
+
+
+def records_to_data(blocks, players):
+    """Block and player records in the JSON layout"""
+    return {
+        "blocks": [
+            {"x": x, "y": y, "width": width, "height": height, "color": color}
+            for x, y, width, height, color in blocks
+        ],
+        "players": [
+            {"x": x, "y": y, "color": color, "gravity": gravity}
+            for x, y, color, gravity in players
+        ],
+    }
+
+
+# umask can only be read by setting it, which changes it for every thread, so it is read once on import
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def get_file_mode(path):
+    """Permission bits path has, or the ones a newly created file would get from the umask"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~UMASK
+
+
+def write_file_atomic(path, data):
+    """Write text or bytes to a temporary file next to path, then rename it over path.
+
+    A crash part way through leaves the old file untouched instead of a half written one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, get_file_mode(path))  # mkstemp makes the file 0600
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def allocate_save_slot(directory=SAVED_LEVELS_DIRECTORY):
+    """Claim the next free saved_level_<n>.json in directory by creating it, so two saves never get the same slot
+
+    Returns:
+        Path of the (empty) file claimed
+    """
+    os.makedirs(directory, exist_ok=True)
+    used = [int(match[1]) for match in map(SAVED_LEVEL_PATTERN.match, os.listdir(directory)) if match]
+    slot = max(used, default=-1) + 1
+    while True:
+        path = os.path.join(directory, f"saved_level_{slot}.json")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))  # Same mode open() gives a new file
+            return path
+        except FileExistsError:
+            slot += 1  # Taken since the directory was listed
+
+
+class LevelSaver:
+    def __init__(self, level_index=None):
+        """Writes levels on one worker thread so saving a large level doesn't hold up the game loop.
+
+        Saves run in the order they were made. There are no threads on the web build, where saves happen
+        immediately.
+
+        Args:
+            level_index: LevelIndex told about every file written
+        """
+        self.level_index = level_index
+        self.executor = None
+        if sys.platform not in ("emscripten", "wasi"):
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-saver")
+
+    def save(self, path, snapshot, merge_grid_size=None):
+        """Write a snapshot from snapshot_level to path as JSON in the background
+
+        Args:
+            path: File to write
+            snapshot: Block and player records from snapshot_level
+            merge_grid_size: Merge touching same-colour blocks on this grid before writing, None writes them as they are
+
+        Returns:
+            Future resolving to path and the merge changes once the file is written, see get_merge_changes. The
+            changes are None when not merging.
+        """
+        if self.executor:
+            return self.executor.submit(self._write, path, snapshot, merge_grid_size)
+
+        future = Future()
+        try:
+            future.set_result(self._write(path, snapshot, merge_grid_size))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _write(self, path, snapshot, merge_grid_size=None):
+        blocks, players = snapshot
+        changes = None
+        if merge_grid_size:
+            changes = get_merge_changes(blocks, merge_grid_size)
+            replaced, added = changes
+            if replaced:
+                replaced = set(replaced)
+                blocks = [record for i, record in enumerate(blocks) if i not in replaced] + added
+        try:
+            write_file_atomic(path, json.dumps(records_to_data(blocks, players), indent=4))
+        except Exception as e:
+            print(f"Error saving level to {path}: {e}")
+            raise
+        if self.level_index:
+            self.level_index.update(path)  # Menus pick up new levels and loads find the new file
+        print(f"Level saved to {path}")
+        return path, changes
+
+    def wait(self):
+        """Block until every save made so far has been written"""
+        if self.executor:
+            self.executor.submit(lambda: None).result()
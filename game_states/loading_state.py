@@ -0,0 +1,50 @@
+import asyncio
+import pygame
+from game_states.state_helpers import BaseState, StateTransition
+
+
+class LoadingState(BaseState):
+    def __init__(self, context):
+        super().__init__(context)
+        self.task = None
+        self.progress = 0.0  # Fraction loaded, 0 to 1
+        self.done_transitions = None  # Transitions to run once loading finishes
+
+    def start(self, coroutine, done_transitions):
+        """Run coroutine as a task on the game loop, must be called while the loop is running"""
+        self.progress = 0.0
+        self.done_transitions = done_transitions
+        self.task = asyncio.get_running_loop().create_task(coroutine)
+
+    def set_progress(self, fraction):
+        self.progress = fraction
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.next_transitions = [StateTransition("quit")]
+            self.context["ui_manager"].process_events(event)
+
+    def update(self, delta_time):
+        self.context["ui_manager"].update(delta_time)
+
+        if self.task and self.task.done():
+            error = self.task.exception()
+            self.task = None
+            if error:
+                # The state being loaded into is half built, go back to the main menu instead
+                print(f"Error loading level: {error}")
+                self.next_transitions = [StateTransition("clear"), StateTransition("push", "menu", {"submenu": "main"})]
+            else:
+                self.next_transitions = self.done_transitions
+
+    def render(self, screen):
+        screen.fill("Dark blue")
+
+        # Progress bar
+        bar_rect = pygame.Rect(0, 0, screen.get_width() // 2, 24)
+        bar_rect.center = (screen.get_width() // 2, screen.get_height() // 2)
+        pygame.draw.rect(screen, "white", bar_rect, 2)
+        fill_rect = bar_rect.inflate(-8, -8)
+        fill_rect.width = round(fill_rect.width * self.progress)
+        pygame.draw.rect(screen, "white", fill_rect)
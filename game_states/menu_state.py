@@ -1,6 +1,65 @@
 import pygame
 import pygame_gui
-from game_states.state_helpers import BaseState, StateTransition
+from game_states.chunked_world import ENDLESS_WORLD_DIRECTORY
+from game_states.state_helpers import BaseState, DirtyRegion, StateTransition
+
+
+# Buttons of each menu, name -> (text, position, size), built the first time the menu is shown
+MENU_LAYOUTS = {
+    "main": {
+        "play": ("Play", (100, 20)),
+        "editor": ("Editor", (100, 80)),
+        "settings": ("Settings", (100, 140)),
+        "endless": ("Endless World", (100, 200)),
+        "quit": ("Quit", (100, 320))
+    },
+    "game_pause": {
+        "resume": ("Resume", (100, 20)),
+        "save": ("Save", (100, 80)),
+        "settings": ("Settings", (100, 140)),
+        "level_select": ("Level Select", (100, 200)),
+        "main_menu": ("Main Menu", (100, 260)),
+        "quit": ("Quit", (100, 320))
+    },
+    "editor_pause": {
+        "resume": ("Resume", (100, 20)),
+        "save": ("Save", (100, 80), (100, 40)),
+        "load": ("Load", (200, 80), (100, 40)),
+        "settings": ("Settings", (100, 140)),
+        "main_menu": ("Main Menu", (100, 260)),
+        "quit": ("Quit", (100, 320))
+    },
+    "settings": {
+        "fullscreen": ("Fullscreen (wip)", (100, 80)),
+        "windowed": ("Windowed", (100, 140)),
+        "back": ("Back", (100, 260))
+    },
+    # Level menus also get a button per option, see _get_level_options
+    "player_count_select": {
+        "back": ("Back", (100, 260)),
+        "main_menu": ("Main Menu", (100, 320)),
+    },
+    "world_select": {
+        "back": ("Back", (100, 260)),
+        "main_menu": ("Main Menu", (100, 320)),
+    },
+    "level_select": {
+        "back": ("Back", (100, 260)),
+        "main_menu": ("Main Menu", (100, 320)),
+    },
+    "endless_select": {
+        "back": ("Back", (100, 260)),
+        "main_menu": ("Main Menu", (100, 320)),
+    },
+}
+
+# Options offered before the level index has finished scanning, and in the editor where new levels can be made
+DEFAULT_LEVEL_OPTIONS = {
+    "player_count_select": range(1, 5),
+    "world_select": range(1, 4),
+    "level_select": range(1, 4),
+    "endless_select": range(1, 5),  # Player counts, the endless world isn't in the level index
+}
 
 
 class MenuState(BaseState):
@@ -8,7 +67,10 @@ class MenuState(BaseState):
         super().__init__(context)
 
         self.ui_manager = context["ui_manager"]
+        self.level_index = context["level_index"]
         self.menu_stack = []
+        self.dirty = DirtyRegion()  # Changed screen areas for dirty-rect rendering
+        self.ui_rects = []  # Screen rects of the UI elements shown last frame
 
         # Panels for each menu
         self.panel = pygame_gui.elements.UIPanel(
@@ -16,73 +78,87 @@ class MenuState(BaseState):
             manager=self.ui_manager
         )
 
-        self.all_buttons = {}
-        self.build_menus()
+        self.all_buttons = {}  # Menu name -> buttons, only menus that have been shown
+        self.built_layouts = {}  # Menu name -> layout its buttons were built from
+        self.shown_menu = None  # Menu whose buttons are visible
         self.push_menu("main")
 
         self.level_select_data = {"players": 1, "world": 1, "level": 1}
 
-    def build_menus(self):
-        self.all_buttons = {
-            "main": {
-                "play": self._add_button("Play", (100, 20)),
-                "editor": self._add_button("Editor", (100, 80)),
-                "settings": self._add_button("Settings", (100, 140)),
-                "quit": self._add_button("Quit", (100, 320))
-            },
-            "game_pause": {
-                "resume": self._add_button("Resume", (100, 20)),
-                "save": self._add_button("Save", (100, 80)),
-                "settings": self._add_button("Settings", (100, 140)),
-                "level_select": self._add_button("Level Select", (100, 200)),
-                "main_menu": self._add_button("Main Menu", (100, 260)),
-                "quit": self._add_button("Quit", (100, 320))
-            },
-            "editor_pause": {
-                "resume": self._add_button("Resume", (100, 20)),
-                "save": self._add_button("Save", (100, 80), (100, 40)),
-                "load": self._add_button("Load", (200, 80), (100, 40)),
-                "settings": self._add_button("Settings", (100, 140)),
-                "main_menu": self._add_button("Main Menu", (100, 260)),
-                "quit": self._add_button("Quit", (100, 320))
-            },
-            "settings": {
-                "fullscreen": self._add_button("Fullscreen (wip)", (100, 80)),
-                "windowed": self._add_button("Windowed", (100, 140)),
-                "back": self._add_button("Back", (100, 260))
-            },
-            "player_count_select": {
-                "1": self._add_button("Solo", (100, 20)),
-                "2": self._add_button("2 Players", (100, 80)),
-                "3": self._add_button("3 Players", (100, 140)),
-                "4": self._add_button("4 Players", (100, 200)),
-                "back": self._add_button("Back", (100, 260)),
-                "main_menu": self._add_button("Main Menu", (100, 320)),
-            },
-            "world_select": {
-                "1": self._add_button("World 1", (100, 20)),
-                "2": self._add_button("World 2", (100, 80)),
-                "3": self._add_button("World 3", (100, 140)),
-                "back": self._add_button("Back", (100, 260)),
-                "main_menu": self._add_button("Main Menu", (100, 320)),
-            },
-            "level_select": {
-                "1": self._add_button("Level 1", (100, 20)),
-                "2": self._add_button("Level 2", (100, 80)),
-                "3": self._add_button("Level 3", (100, 140)),
-                "back": self._add_button("Back", (100, 260)),
-                "main_menu": self._add_button("Main Menu", (100, 320)),
-            },
-        }
-
-    def _add_button(self, text, pos, size = (200, 40)):
+    def _get_menu(self, menu_name):
+        """Buttons of a menu, created the first time it is shown and again if its layout changed"""
+        layout = self._get_layout(menu_name)
+        if self.built_layouts.get(menu_name) != layout:
+            for button in self.all_buttons.get(menu_name, {}).values():
+                button.kill()
+            self.all_buttons[menu_name] = {name: self._add_button(*button_layout) for name, button_layout in layout.items()}
+            self.built_layouts[menu_name] = layout
+        return self.all_buttons[menu_name]
+
+    def _get_layout(self, menu_name):
+        layout = MENU_LAYOUTS.get(menu_name, {})
+        if menu_name not in DEFAULT_LEVEL_OPTIONS:
+            return layout
+
+        # One button per option, in columns of 4 above the back buttons
+        options = self._get_level_options(menu_name)
+        columns = max(1, (len(options) + 3) // 4)
+        width = (360 - 10 * (columns - 1)) // columns if columns > 1 else 200
+        option_layout = {}
+        for i, (option, text, tool_tip) in enumerate(options):
+            x = 20 + (i // 4) * (width + 10) if columns > 1 else 100
+            option_layout[str(option)] = (text, (x, 20 + (i % 4) * 60), (width, 40), tool_tip)
+        return {**option_layout, **layout}
+
+    def _get_level_options(self, menu_name):
+        """Player counts, worlds or levels to pick from as (number, button text, tool tip)"""
+        if menu_name == "endless_select":
+            return [(option, "Solo" if option == 1 else f"{option} Players", None) for option in DEFAULT_LEVEL_OPTIONS[menu_name]]
+
+        players = self.level_select_data["players"]
+        world = self.level_select_data["world"]
+        if menu_name == "player_count_select":
+            indexed = self.level_index.get_player_counts()
+        elif menu_name == "world_select":
+            indexed = self.level_index.get_worlds(players)
+        else:
+            indexed = self.level_index.get_levels(players, world)
+
+        options = set(indexed)
+        if not self.level_index.is_ready() or (self.menu_stack and self.menu_stack[0] == "editor_pause"):
+            options.update(DEFAULT_LEVEL_OPTIONS[menu_name])
+
+        result = []
+        for option in sorted(options):
+            tool_tip = None
+            if menu_name == "player_count_select":
+                text = "Solo" if option == 1 else f"{option} Players"
+            elif menu_name == "world_select":
+                text = f"World {option}"
+            else:
+                text = f"Level {option}"
+                metadata = self.level_index.get(players, world, option)
+                tool_tip = f"{metadata['block_count']} blocks, {metadata['player_count']} players" if metadata else "New level"
+            result.append((option, text, tool_tip))
+        return result
+
+    def _add_button(self, text, pos, size = (200, 40), tool_tip=None):
         return pygame_gui.elements.UIButton(
             relative_rect=pygame.Rect(pos, size),
             text=text,
             manager=self.ui_manager,
-            container=self.panel
+            container=self.panel,
+            tool_tip_text=tool_tip,
+            visible=False
         )
 
+    def _get_pressed_option(self, menu_name, element):
+        """Number of the level menu option button that is element, None if it is another button"""
+        for name, button in self.all_buttons[menu_name].items():
+            if name.isdigit() and element == button:
+                return int(name)
+        return None
+
     def switch_menu(self, menu_name):
         if self.menu_stack:
             self.menu_stack[-1] = menu_name
@@ -100,16 +176,19 @@ class MenuState(BaseState):
         self._refresh_buttons()
 
     def _refresh_buttons(self):
-        # Hide all buttons
-        for menu in self.all_buttons.values():
-            for button in menu.values():
-                button.hide()
-
-        if self.menu_stack:
-            current = self.menu_stack[-1]
-            for button in self.all_buttons.get(current, {}).values():
-                button.show()
-        self.panel.show() if self.menu_stack else self.panel.hide()
+        # Only the outgoing and incoming menus' buttons change visibility
+        current = self.menu_stack[-1] if self.menu_stack else None
+        if current != self.shown_menu:
+            if self.shown_menu:
+                for button in self.all_buttons[self.shown_menu].values():
+                    button.hide()
+            if current:
+                for button in self._get_menu(current).values():
+                    button.show()
+            self.shown_menu = current
+        # Leave the buttons alone, the panel would otherwise show or hide every button ever built
+        self.panel.show(show_contents=False) if self.menu_stack else self.panel.hide(hide_contents=False)
+        self.dirty.mark(self.panel.rect)
 
     def handle_events(self, events):
         for event in events:
@@ -135,6 +214,8 @@ class MenuState(BaseState):
                 self.next_transitions = [StateTransition("switch", "editor")]
             elif element == self.all_buttons[current_menu]["settings"]:
                 self.push_menu("settings")
+            elif element == self.all_buttons[current_menu]["endless"]:
+                self.push_menu("endless_select")
             elif element == self.all_buttons[current_menu]["quit"]:
                 self.next_transitions = [StateTransition("quit")]
 
@@ -175,48 +256,67 @@ class MenuState(BaseState):
                 self.pop_menu()
             elif element == self.all_buttons[current_menu]["main_menu"]:
                 self.next_transitions = [StateTransition("clear"), StateTransition("push", "menu", {"submenu": "main"})]
-            for i in range(1, 5):
-                if element == self.all_buttons[current_menu][str(i)]:
-                    self.level_select_data["players"] = i
-                    self.push_menu("world_select")
-                    break
+            option = self._get_pressed_option(current_menu, element)
+            if option is not None:
+                self.level_select_data["players"] = option
+                self.push_menu("world_select")
 
         elif current_menu == "world_select":
             if element == self.all_buttons[current_menu]["back"]:
                 self.pop_menu()
             elif element == self.all_buttons[current_menu]["main_menu"]:
                 self.next_transitions = [StateTransition("clear"), StateTransition("push", "menu", {"submenu": "main"})]
-            for i in range(1, 4):
-                if element == self.all_buttons[current_menu][str(i)]:
-                    self.level_select_data["world"] = i
-                    self.push_menu("level_select")
-                    break
+            option = self._get_pressed_option(current_menu, element)
+            if option is not None:
+                self.level_select_data["world"] = option
+                self.push_menu("level_select")
 
         elif current_menu == "level_select":
             if element == self.all_buttons[current_menu]["back"]:
                 self.pop_menu()
             elif element == self.all_buttons[current_menu]["main_menu"]:
                 self.next_transitions = [StateTransition("clear"), StateTransition("push", "menu", {"submenu": "main"})]
-            for i in range(1, 4):
-                if element == self.all_buttons[current_menu][str(i)]:
-                    self.level_select_data["level"] = i
-                    # if the level is selected from the main menu or from in-game
-                    if self.menu_stack[0] == "main" or self.menu_stack[0] == "game_pause":
-                        self.next_transitions = [StateTransition("switch", "game", {"level_select_data": self.level_select_data})]
-                    # if the level is selected from the editor
-                    if self.menu_stack[0] == "editor_pause":
-                        self.next_transitions = [
-                            # Close the menu
-                            StateTransition("pop"),
-                            # Editor is already open behind the menu, no type needed. Data is passed in and will load
-                            StateTransition(None, "editor", {"level_select_data": self.level_select_data})
-                        ]
-                    self.menu_stack.clear()
-                    break
+            option = self._get_pressed_option(current_menu, element)
+            if option is not None:
+                self.level_select_data["level"] = option
+                # if the level is selected from the main menu or from in-game
+                if self.menu_stack[0] == "main" or self.menu_stack[0] == "game_pause":
+                    self.next_transitions = [StateTransition("switch", "game", {"level_select_data": self.level_select_data})]
+                # if the level is selected from the editor
+                if self.menu_stack[0] == "editor_pause":
+                    self.next_transitions = [
+                        # Close the menu
+                        StateTransition("pop"),
+                        # Editor is already open behind the menu, no type needed. Data is passed in and will load
+                        StateTransition(None, "editor", {"level_select_data": self.level_select_data})
+                    ]
+                self.menu_stack.clear()
+
+        elif current_menu == "endless_select":
+            if element == self.all_buttons[current_menu]["back"]:
+                self.pop_menu()
+            elif element == self.all_buttons[current_menu]["main_menu"]:
+                self.next_transitions = [StateTransition("clear"), StateTransition("push", "menu", {"submenu": "main"})]
+            option = self._get_pressed_option(current_menu, element)
+            if option is not None:
+                world_data = {"directory": ENDLESS_WORLD_DIRECTORY, "players": option}
+                self.next_transitions = [StateTransition("switch", "game", {"world_data": world_data})]
+                self.menu_stack.clear()
 
     def update(self, time_delta):
         self.ui_manager.update(time_delta)
 
+        # pygame_gui changes hover fades, tooltips and text cursors by itself, so everything it shows is redrawn each
+        # frame, along with what it showed last frame in case that was hidden since
+        root_container = self.ui_manager.get_root_container()
+        ui_rects = [element.rect.copy() for element in self.ui_manager.get_sprite_group().sprites()
+                    if element.visible and element is not root_container]
+        for rect in self.ui_rects:
+            self.dirty.mark(rect)
+        for rect in ui_rects:
+            self.dirty.mark(rect)
+        self.ui_rects = ui_rects
+
     def render(self, screen):
         if self.menu_stack:
             # Render based on the menu, allows game_state to be seen behind the pause menu
@@ -224,3 +324,6 @@ class MenuState(BaseState):
                 # Add main menu images and fun stuff here
                 screen.fill("Dark blue")
         self.ui_manager.draw_ui(screen)
+
+    def get_dirty_rects(self):
+        return self.dirty.take()
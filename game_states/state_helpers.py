@@ -1,45 +1,256 @@
+import asyncio
 import json
+import math
 import os
+import sys
+import time
 
 import pygame
 from game_classes.block_class import Block
+from game_classes.block_merge import merge_if_smaller
+from game_classes.chunk_layer import StaticChunkLayer
+from game_classes.block_group import BlockGroup
+from game_classes.entity_group import EntityGroup
 from game_classes.player_class import Player
+from game_classes.spatial_hash import SpatialHash
+from game_states.level_format import BINARY_EXTENSION, JSON_EXTENSION, open_level
+
+# Cells of the static block index are this many grid squares wide
+BLOCK_INDEX_CELLS = 8
+
+
+def get_level_path(player_count, world, level, extension=JSON_EXTENSION):
+    return f"levels/{player_count}_players/world_{world}/level_{level}{extension}"
+
+
+def find_level_file(player_count, world, level, level_index=None):
+    """Path of the level's newest file, binary or JSON. The JSON path is returned if neither exists.
+
+    Once level_index has finished scanning it is asked instead of the filesystem.
+    """
+    if level_index and level_index.is_ready():
+        metadata = level_index.get(player_count, world, level)
+        return metadata["path"] if metadata else get_level_path(player_count, world, level)
+
+    json_path = get_level_path(player_count, world, level)
+    binary_path = get_level_path(player_count, world, level, BINARY_EXTENSION)
+    if not os.path.exists(binary_path):
+        return json_path
+    if os.path.exists(json_path) and os.path.getmtime(json_path) > os.path.getmtime(binary_path):
+        return json_path  # JSON was saved from the editor after the binary was made
+    return binary_path
+
+
+def level_exists(player_count, world, level, level_index=None):
+    """Whether the level has a file, asks level_index instead of the filesystem once it has finished scanning"""
+    if level_index and level_index.is_ready():
+        return level_index.get(player_count, world, level) is not None
+    return os.path.exists(find_level_file(player_count, world, level))
+
+
+def create_empty_level(path, level_index=None):
+    """Write an empty JSON level to path, returns whether it worked"""
+    print(f"Creating an empty level in {path}")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"blocks": [], "players": []}, f)
+    except Exception as e:
+        print(f"Error creating level file: {e}")
+        return False
+    if level_index:
+        level_index.update(path)
+    return True
+
+
+def iter_build_level(app_state, grid_size, block_records, player_records, batch_size=500):
+    """Build a level in batches, yielding the number of blocks built after each batch.
+
+    The new sprites, block index and chunk layer replace app_state's only once everything is built,
+    so the state stays usable while a level loads in the background.
+
+    Args:
+        block_records: Iterable of (x, y, width, height, color)
+        player_records: Iterable of (x, y, color, gravity)
+    """
+    game_sprites = {"blocks": BlockGroup(), "players": EntityGroup()}
+    block_index = SpatialHash(grid_size * BLOCK_INDEX_CELLS)
+
+    built = 0
+    for x, y, width, height, color in block_records:
+        block = Block(grid_size, pygame.Rect(x, y, width, height), color)
+        game_sprites["blocks"].add(block)
+        block_index.insert(block)
+        built += 1
+        if built % batch_size == 0:
+            yield built
+
+    chunk_layer = StaticChunkLayer()
+    chunk_layer.build(game_sprites["blocks"])
+
+    for x, y, color, gravity in player_records:
+        player = Player((x, y), color, gravity)
+        player.color = color
+        player.add(game_sprites["players"])
+
+    app_state.game_sprites = game_sprites
+    app_state.block_index = block_index
+    app_state.chunk_layer = chunk_layer
+    yield built
+
+
+def build_level(app_state, grid_size, block_records, player_records):
+    """Replace app_state's sprites, block index and chunk layer with the described blocks and players"""
+    for _ in iter_build_level(app_state, grid_size, block_records, player_records):
+        pass
+
+
+def read_level_records(path, grid_size, merge_blocks=False):
+    """Read every block and player record of a level file, safe to run on a worker thread"""
+    with open_level(path) as level:
+        block_records = list(level.iter_blocks())
+        player_records = list(level.iter_players())
+    if merge_blocks:
+        block_records = merge_if_smaller(block_records, grid_size)
+    return block_records, player_records
+
+
+def load_level_file(app_state, grid_size, path, merge_blocks=False):
+    with open_level(path) as level:
+        block_records = level.iter_blocks()
+        if merge_blocks:
+            block_records = merge_if_smaller(block_records, grid_size)
+        build_level(app_state, grid_size, block_records, level.iter_players())
 
 
 # Shared logic for loading a level
-def load_level(app_state, grid_size, player_count, world, level, retry_count=0):
+def load_level(app_state, grid_size, player_count, world, level, merge_blocks=False, retry_count=0, level_index=None):
     if retry_count >= 2:
         print("Failed to load or create level file after maximum retries")
         return False
 
+    path = find_level_file(player_count, world, level, level_index)
+    if not level_exists(player_count, world, level, level_index):
+        print(f"Level not found in {path}")
+        if not create_empty_level(path, level_index):
+            return False
+
     try:
-        with open(f"levels/{player_count}_players/world_{world}/level_{level}.json", "r") as f:
-            data = json.load(f)
-            app_state.game_sprites = {"blocks": pygame.sprite.Group(), "players": pygame.sprite.Group()}
-
-            for block_data in data["blocks"]:
-                block = Block(grid_size, pygame.Rect(block_data["x"], block_data["y"], block_data["width"], block_data["height"]))
-                block.color = block_data["color"]
-                block.add(app_state.game_sprites["blocks"])
-            for player_data in data["players"]:
-                player = Player((player_data["x"], player_data["y"]), player_data["color"], player_data["gravity"])
-                player.color = player_data["color"]
-                player.add(app_state.game_sprites["players"])
-
-        print(f"Level loaded from levels/{player_count}_players/world_{world}/level_{level}.json")
+        load_level_file(app_state, grid_size, path, merge_blocks)
+        print(f"Level loaded from {path}")
         return True
     except FileNotFoundError:
-        print(f"Level not found in levels/{player_count}_players/world_{world}/level_{level}.json")
-        print(f"Creating an empty level in levels/{player_count}_players/world_{world}/level_{level}.json")
-        try:
-            os.makedirs(os.path.dirname(f"levels/{player_count}_players/world_{world}/level_{level}.json"),
-                        exist_ok=True)
-            with open(f"levels/{player_count}_players/world_{world}/level_{level}.json", "w") as f:
-                json.dump({"blocks": [], "players": []}, f)
-            return load_level(app_state, grid_size, player_count, world, level, retry_count + 1)
-        except Exception as e:
-            print(f"Error creating level file: {e}")
-            return False
+        # Removed since it was indexed
+        print(f"Level not found in {path}")
+        if level_index:
+            level_index.remove(path)
+        return load_level(app_state, grid_size, player_count, world, level, merge_blocks, retry_count + 1, level_index)
+
+
+# Cooperative version of load_level for use inside the asyncio game loop
+async def load_level_async(app_state, grid_size, player_count, world, level, progress=None, merge_blocks=False, use_thread=None, frame_budget=0.008, level_index=None):
+    """Load a level while letting the game loop keep running.
+
+    Args:
+        progress: Callable taking the fraction of the level loaded so far
+        merge_blocks: Coalesce touching same-colour blocks before building them
+        use_thread: Parse the file on a worker thread, defaults to on for desktop and off for the web build
+        frame_budget: Seconds of building done before yielding back to the game loop
+        level_index: LevelIndex used to find the file instead of probing the filesystem
+    """
+    if not level_exists(player_count, world, level, level_index):
+        return load_level(app_state, grid_size, player_count, world, level, merge_blocks, level_index=level_index)  # Creates the missing level
+    path = find_level_file(player_count, world, level, level_index)
+
+    if use_thread is None:
+        use_thread = sys.platform not in ("emscripten", "wasi")  # No threads on the web build
+
+    try:
+        if use_thread:
+            block_records, player_records = await asyncio.get_running_loop().run_in_executor(None, read_level_records, path, grid_size, merge_blocks)
+        else:
+            block_records, player_records = read_level_records(path, grid_size, merge_blocks)
+            await asyncio.sleep(0)
+    except FileNotFoundError:
+        # Removed since it was indexed, same retry as load_level
+        print(f"Level not found in {path}")
+        if level_index:
+            level_index.remove(path)
+        return load_level(app_state, grid_size, player_count, world, level, merge_blocks, 1, level_index)
+
+    batch_start = time.perf_counter()
+    for built in iter_build_level(app_state, grid_size, block_records, player_records, batch_size=100):
+        if progress:
+            progress(built / len(block_records) if block_records else 1.0)
+        if time.perf_counter() - batch_start > frame_budget:
+            await asyncio.sleep(0)
+            batch_start = time.perf_counter()
+
+    print(f"Level loaded from {path}")
+    return True
+
+
+# Shared logic for drawing a state's sprites
+def render_sprites(screen, camera, game_sprites):
+    """Draw only the sprites intersecting the camera's view.
+
+    Returns:
+        Dict with the number of sprites drawn and culled this frame
+    """
+    visible_rect = camera.get_visible_rect()
+    drawn = 0
+    culled = 0
+    for object_group in game_sprites.values():
+        for sprite in object_group.sprite_list():
+            if visible_rect.colliderect(sprite.get_bounds()):
+                sprite.draw(screen, camera)
+                drawn += 1
+            else:
+                culled += 1
+    return {"drawn": drawn, "culled": culled}
+
+
+class DirtyRegion:
+    def __init__(self):
+        """Screen areas a state has changed since it last rendered, used by dirty-rect rendering.
+
+        Starts fully dirty so the first frame is drawn completely.
+        """
+        self.rects = []
+        self.full = True
+        self.camera_view = None  # Camera position and zoom at the last take
+
+    def mark(self, rect):
+        self.rects.append(pygame.Rect(rect))
+
+    def mark_world(self, rect, camera):
+        """Mark the screen area a rect in game coordinates is drawn to, padded for rounding"""
+        self.rects.append(pygame.Rect(
+            math.floor((rect[0] - camera.x) * camera.zoom) - 1,
+            math.floor((rect[1] - camera.y) * camera.zoom) - 1,
+            math.ceil(rect[2] * camera.zoom) + 3,
+            math.ceil(rect[3] * camera.zoom) + 3
+        ))
+
+    def mark_all(self):
+        self.full = True
+
+    def take(self, camera=None):
+        """Changed areas since the last call, None if everything needs redrawing. Everything does when camera moved.
+
+        Returns:
+            List of screen rects, or None
+        """
+        if camera:
+            camera_view = (camera.x, camera.y, camera.zoom)
+            if camera_view != self.camera_view:
+                self.camera_view = camera_view
+                self.full = True
+
+        rects = None if self.full else self.rects
+        self.rects = []
+        self.full = False
+        return rects
 
 
 class StateTransition:
@@ -62,3 +273,7 @@ class BaseState:
 
     def render(self, screen):
         pass
+
+    def get_dirty_rects(self):
+        """Screen rects changed since the last call, None redraws everything. Called once per frame before render."""
+        return None
@@ -6,6 +6,9 @@
 # ]
 # ///
 
+import time
+STARTUP_START = time.perf_counter()  # Taken before the heavy imports so they are included in the startup time
+
 import asyncio
 import sys
 import pygame
@@ -13,50 +16,82 @@ import pygame_gui
 from game_states.editor_state import EditorState
 from game_states.menu_state import MenuState
 from game_states.game_state import GameState
+from game_states.level_index import LevelIndex
+from game_states.loading_state import LoadingState
+from game_states.state_helpers import StateTransition
 from game_classes.input_handler import InputHandler
+from game_classes.input_state import input_state
+from game_classes.profiler import FrameProfiler
 
 WIDTH, HEIGHT = 1280, 720  # Use 320x180 or multiples
 
 
 class GameApp:
     def __init__(self):
+        self.startup_times = {}  # Step -> milliseconds since STARTUP_START, until the first frame is shown
+        self._mark_startup("imports")
+
         pygame.init()
         self.clock = pygame.time.Clock()
         if sys.platform in ('emscripten','wasi'):
             self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         else:
             self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.RESIZABLE)
+        self._mark_startup("display")
+
+        ui_manager = pygame_gui.UIManager((WIDTH, HEIGHT))
+        self._mark_startup("ui_manager")
+
+        level_index = LevelIndex()
+        level_index.start()  # Scans levels/ in the background while the rest starts up
 
         self.game_context = {
-            "ui_manager": pygame_gui.UIManager((WIDTH, HEIGHT)),
+            "ui_manager": ui_manager,
             "screen_size": (WIDTH, HEIGHT),
             "input_handlers": [],
-            "grid_size": 16
+            "grid_size": 16,
+            "physics_tick_rate": 60,  # Fixed simulation steps per second
+            "max_physics_steps": 5,  # Most simulation steps run in one frame before dropping time
+            "physics_backend": "python",  # "numpy" steps all players together on arrays, only faster with 64+ players, needs NumPy
+            "merge_blocks_on_load": False,  # Coalesce touching blocks when a level loads
+            "merge_blocks_on_save": True,  # Coalesce touching blocks when the editor saves, done on the saver's worker
+            "profiler": FrameProfiler(),  # Frame timings, F3 toggles the overlay and F4 saves them to profiles/
+            "dirty_rect_rendering": True,  # Only redraw and update the parts of the screen that changed
+            "level_index": level_index  # Metadata of every level file, menus are built from it
         }
-        self.state_instances = {
-            "menu": MenuState(self.game_context),
-            "game": GameState(self.game_context),
-            "editor": EditorState(self.game_context),
+        # States are created the first time they are needed
+        self.state_factories = {
+            "menu": MenuState,
+            "game": GameState,
+            "editor": EditorState,
+            "loading": LoadingState,
         }
-        self.state_stack = [self.state_instances["menu"]]
+        self.state_instances = {}
+        self.state_stack = [self.get_state("menu")]
         self.running = True
+        self._mark_startup("states")
+
+        # === Dirty-rect rendering ===
+        self.rendered_stack = []  # States drawn last frame, any change to the stack redraws everything
+        self.full_redraw = True  # Set when the window contents may have been lost
 
-        # Load input handlers, no inputs can be added after
+        # Load input handlers, joysticks plugged in later get theirs as they connect
         self.load_input_handlers()
+        self._mark_startup("input_handlers")
+
+    def _mark_startup(self, step):
+        self.startup_times[step] = (time.perf_counter() - STARTUP_START) * 1000
+
+    def get_state(self, name):
+        state = self.state_instances.get(name)
+        if state is None:
+            state = self.state_instances[name] = self.state_factories[name](self.game_context)
+        return state
 
     def load_input_handlers(self):
         self.game_context["input_handlers"] = []
-        for joystick in [pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())]:
-            print(f"Joystick {joystick.get_instance_id()}: {joystick.get_name()}")
-
-            has_handler = False
-            # Check if joystick has a handler, if not add it
-            for handler in self.game_context["input_handlers"]:
-                if handler.joystick:
-                    if joystick.get_instance_id() == handler.joystick.get_instance_id():
-                        has_handler = True
-            if not has_handler:
-                self.game_context["input_handlers"].append(InputHandler(joystick))
+        for joystick in input_state.scan_joysticks():
+            self.add_joystick_handler(joystick)
 
         self.game_context["input_handlers"].append(InputHandler("keyboard_1"))
         self.game_context["input_handlers"].append(InputHandler("keyboard_2"))
@@ -70,18 +105,76 @@ class GameApp:
                 print(handler.joystick)
         print(self.game_context["input_handlers"])
 
+    def add_joystick_handler(self, joystick):
+        print(f"Joystick {joystick.get_instance_id()}: {joystick.get_name()}")
+        # Before the keyboards so controllers keep coming first
+        keyboard_count = sum(1 for handler in self.game_context["input_handlers"] if isinstance(handler.joystick, str))
+        self.game_context["input_handlers"].insert(len(self.game_context["input_handlers"]) - keyboard_count, InputHandler(joystick))
+
+    def remove_joystick_handler(self, joystick):
+        """Drop the handler of a disconnected joystick, its player can be picked up by another handler"""
+        for handler in list(self.game_context["input_handlers"]):
+            if handler.joystick is joystick:
+                if handler.player:
+                    handler.player.input_handler = None
+                    handler.player = None
+                self.game_context["input_handlers"].remove(handler)
+                print(f"Joystick disconnected, {len(self.game_context['input_handlers'])} input handlers left")
+
     async def run(self):
         while self.running:
-            self._handle_events()
-            self._handle_state_transitions()
-            self._update()
-            self._render()
+            self._frame()
             await asyncio.sleep(0)  # Yield to web
 
         pygame.quit()
 
+    def _report_startup(self):
+        self._mark_startup("first_frame")
+        steps = ", ".join(f"{step} {ms:.0f}" for step, ms in self.startup_times.items())
+        print(f"Startup took {self.startup_times['first_frame']:.0f} ms to the first frame ({steps} ms)")
+        self.game_context["profiler"].startup_times = self.startup_times
+
+    def _frame(self):
+        profiler = self.game_context["profiler"]
+        profiler.begin_frame()
+        with profiler.phase("events"):
+            self._handle_events()
+        with profiler.phase("transitions"):
+            self._handle_state_transitions()
+        with profiler.phase("wait"):
+            time_delta = self.clock.tick(60) / 1000.0
+        with profiler.phase("update"):
+            self._update(time_delta)
+        with profiler.phase("render"):
+            dirty_rects = self._render()
+        with profiler.phase("flip"):
+            if dirty_rects is None:
+                pygame.display.flip()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+        profiler.end_frame(self.state_stack[-1] if self.state_stack else None)
+        if "first_frame" not in self.startup_times:
+            self._report_startup()
+
     def _handle_events(self):
         events = pygame.event.get()
+        # Devices are read once here, every input consumer uses this snapshot for the rest of the frame
+        input_state.begin_frame(events)
+        for joystick in input_state.added:
+            self.add_joystick_handler(joystick)
+        for joystick in input_state.removed:
+            self.remove_joystick_handler(joystick)
+
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.game_context["profiler"].toggle_overlay()
+                if event.key == pygame.K_F4:
+                    path = time.strftime("profiles/frames_%Y%m%d_%H%M%S")
+                    self.game_context["profiler"].dump(path + ".csv")
+                    self.game_context["profiler"].dump(path + ".json")
+            if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESIZED, pygame.WINDOWSIZECHANGED, pygame.VIDEOEXPOSE):
+                self.full_redraw = True
         self.state_stack[-1].handle_events(events)
 
     def _handle_state_transitions(self):
@@ -98,26 +191,41 @@ class GameApp:
             # Run custom actions from transition.data
             if transition.data:
                 if transition.target:
-                    state = self.state_instances[transition.target]
+                    state = self.get_state(transition.target)
                 else:
                     state = self.state_stack[-1]
 
                 # Custom actions depending on transition.data
                 if "submenu" in transition.data and hasattr(state, "switch_menu"):
                     state.switch_menu(transition.data["submenu"])
-                if "level_select_data" in transition.data and hasattr(state, "load_level"):
+                loading = None
+                if "level_select_data" in transition.data and hasattr(state, "load_level_async"):
                     data = transition.data.get("level_select_data")
-                    state.load_level(data["players"], data["world"], data["level"])
+                    loading = self.get_state("loading")
+                    coroutine = state.load_level_async(data["players"], data["world"], data["level"], loading.set_progress)
+                elif "world_data" in transition.data and hasattr(state, "load_world_async"):
+                    data = transition.data.get("world_data")
+                    loading = self.get_state("loading")
+                    coroutine = state.load_world_async(data["directory"], data["players"], loading.set_progress)
+                if loading:
+                    # Load in the background behind the loading screen, then carry on with the transition
+                    if transition.type == "switch":
+                        done_transitions = [StateTransition("switch", transition.target)]
+                        transition = StateTransition("switch", "loading")
+                    else:
+                        done_transitions = [StateTransition("pop")]
+                        transition = StateTransition("push", "loading")
+                    loading.start(coroutine, done_transitions)
 
             if transition.type == "quit":
                 self.running = False
 
             elif transition.type == "switch":
-                state = self.state_instances[transition.target]
+                state = self.get_state(transition.target)
                 self.state_stack[-1] = state
 
             elif transition.type == "push":
-                state = self.state_instances[transition.target]
+                state = self.get_state(transition.target)
                 self.state_stack.append(state)  # Add the new state to front of stack
 
             elif transition.type == "setting_change":
@@ -125,6 +233,7 @@ class GameApp:
                     self.screen = pygame.display.set_mode(self.game_context["game_size"], pygame.FULLSCREEN)
                 if "windowed" in transition.data:
                     self.screen = pygame.display.set_mode(self.game_context["game_size"], pygame.SCALED | pygame.RESIZABLE)
+                self.full_redraw = True
 
             elif transition.type == "pop":
                 # Pops the top-most state
@@ -144,19 +253,53 @@ class GameApp:
         # Always reset transition
         self.state_stack[-1].next_transitions = None
 
-    def _update(self):
+    def _update(self, time_delta):
         caption = f"{int(self.clock.get_fps()):02d} FPS"
         pygame.display.set_caption(caption)
-        time_delta = self.clock.tick(60) / 1000.0
-        self.state_stack[-1].update(time_delta)
+        state = self.state_stack[-1]
+        with self.game_context["profiler"].phase(f"update:{type(state).__name__}"):
+            state.update(time_delta)
+
+    def _get_dirty_rects(self):
+        """Screen rects that changed since the last frame, None if everything needs redrawing"""
+        full_redraw = self.full_redraw or self.state_stack != self.rendered_stack
+        self.full_redraw = False
+        self.rendered_stack = list(self.state_stack)
+
+        rects = []
+        for state in self.state_stack:
+            state_rects = state.get_dirty_rects()  # Always asked so every state starts the next frame clean
+            if state_rects is None:
+                full_redraw = True
+            else:
+                rects += state_rects
+        rects += self.game_context["profiler"].get_dirty_rects(self.screen)
+
+        if full_redraw:
+            return None
+        screen_rect = self.screen.get_rect()
+        return [rect.clip(screen_rect) for rect in rects if rect.colliderect(screen_rect)]
 
     def _render(self):
+        """Draw the state stack. Returns the rects drawn to, None if the whole screen was."""
+        dirty_rects = None
+        if self.game_context["dirty_rect_rendering"]:
+            dirty_rects = self._get_dirty_rects()
+            if dirty_rects == []:
+                return dirty_rects  # Nothing changed, the last frame stays on screen
+            if dirty_rects:
+                self.screen.set_clip(dirty_rects[0].unionall(dirty_rects[1:]))
+
         self.screen.fill("hot pink")  # This is the background behind every state, this should not be seen.
 
+        profiler = self.game_context["profiler"]
         for state in self.state_stack:
-            state.render(self.screen)
+            with profiler.phase(f"render:{type(state).__name__}"):
+                state.render(self.screen)
+        profiler.draw(self.screen)
 
-        pygame.display.flip()
+        self.screen.set_clip(None)
+        return dirty_rects
 
 
 app = GameApp()